@@ -0,0 +1,484 @@
+import gzip
+import json as json_module
+import os
+import shutil
+import tempfile
+import uuid
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+DEFAULT_TIMEOUT = (5, 30)
+MAX_WORKERS = 4
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+UPLOAD_GZIP_LEVEL = 6
+# Emit upload progress at most once per this many bytes sent.
+UPLOAD_PROGRESS_STEP = 256 * 1024
+
+# Returned by a worker when a revalidated response matched what the caller
+# was already shown from the cache.
+UNCHANGED = object()
+
+
+class ApiRequest:
+    """Handle for one logical request; several callers may share it."""
+
+    def __init__(self, client, key, channel):
+        self.client = client
+        self.key = key
+        self.channel = channel
+        self.callbacks = []
+        self.on_progress = None
+        self.cancelled = False
+        self.runnable = None
+        # The streamed response being read, so cancelling can close it.
+        self.response = None
+
+    def cancel(self):
+        self.client._cancel(self)
+
+
+class _WorkerSignals(QObject):
+    succeeded = pyqtSignal(object, object)
+    failed = pyqtSignal(object, str)
+    progress = pyqtSignal(object, object)
+
+
+class _Worker(QRunnable):
+    def __init__(self, request, send, signals):
+        super().__init__()
+        # The owning ApiRequest keeps this alive until a result is delivered.
+        self.setAutoDelete(False)
+        self.request = request
+        self.send = send
+        self.signals = signals
+
+    def run(self):
+        if self.request.cancelled:
+            self.signals.failed.emit(self.request, 'cancelled')
+            return
+        try:
+            result = self.send(self.request)
+        except Exception as e:
+            self.signals.failed.emit(self.request, str(e))
+        else:
+            self.signals.succeeded.emit(self.request, result)
+
+
+class ApiClient(QObject):
+    """Shared HTTP client for the desktop app.
+
+    All calls go through one keep-alive ``requests.Session`` on a bounded
+    thread pool. Identical GETs already in flight are coalesced, and a new
+    request on a ``channel`` cancels the previous one so stale responses
+    (e.g. from rapid history clicks) are dropped. Cancelling closes a
+    response whose body is still arriving, which frees its worker for the
+    request that replaced it; a request still waiting for headers is
+    bounded by the read timeout.
+
+    GETs can use an optional on-disk ``cache``: ``'immutable'`` answers from
+    the cache without touching the network when the caller passes a
+    ``version`` (e.g. the dataset's upload time) that the entry was stored
+    under, and revalidates with If-None-Match without one; ``'swr'`` hands
+    the cached body to the caller at once and calls again only if
+    revalidation returns something new. Either falls back to the cache when
+    the server is unreachable. ``download`` streams large bodies such as PDF
+    reports straight to disk.
+    """
+
+    connectivity_changed = pyqtSignal(bool)
+
+    def __init__(self, base_url, max_workers=MAX_WORKERS, timeout=DEFAULT_TIMEOUT, cache=None,
+                 parent=None):
+        super().__init__(parent)
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = cache
+        self.offline = False
+
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.2, allowed_methods=['GET'],
+                      status_forcelist=[502, 503, 504])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+
+        self._signals = _WorkerSignals()
+        self._signals.succeeded.connect(self._on_succeeded)
+        self._signals.failed.connect(self._on_failed)
+        self._signals.progress.connect(self._on_progress)
+        self._inflight = {}
+        self._channels = {}
+
+    def url(self, path):
+        return f'{self.base_url}/{path.lstrip("/")}'
+
+    def set_token(self, token):
+        if token:
+            self.session.headers['Authorization'] = f'Token {token}'
+        else:
+            self.session.headers.pop('Authorization', None)
+
+    def get(self, path, on_success=None, on_error=None, params=None, channel=None,
+            timeout=None, parse='json', cache=None, version=None):
+        if self.cache is None:
+            cache = None
+        key = ('GET', path, tuple(sorted((params or {}).items())), parse, cache, version)
+        shown = False
+        if cache == 'swr' and on_success is not None:
+            cached = self.cache.get(self.cache.key(self.url(path), params))
+            if cached is not None:
+                on_success(self._decode(cached.body, parse))
+                shown = True
+        return self._submit(key, channel, on_success, on_error, lambda request: self._send_get(
+            request, path, params, timeout, parse, cache, shown, version
+        ))
+
+    def post(self, path, on_success=None, on_error=None, json=None, data=None, files=None,
+             headers=None, channel=None, timeout=None):
+        return self._submit(None, channel, on_success, on_error, lambda request: self._parse(
+            self._request('POST', self.url(path), json=json, data=data, files=files,
+                          headers=headers, timeout=timeout or self.timeout),
+            'json'
+        ))
+
+    def download(self, path, file_path, on_success=None, on_error=None, on_progress=None,
+                 params=None, channel=None, timeout=None):
+        """Stream a GET response into ``file_path`` without holding it in memory.
+
+        ``on_progress(received, total)`` reports wire bytes (``total`` is 0 when
+        the server sends no Content-Length) and ``on_success(file_path)`` fires
+        once the file is complete. A cancelled download leaves no file behind.
+        """
+        request = self._submit(None, channel, on_success, on_error, lambda request: self._send_download(
+            request, path, file_path, params, timeout
+        ))
+        request.on_progress = on_progress
+        return request
+
+    def upload(self, path, file_path, on_success=None, on_error=None, on_progress=None,
+               params=None, field='file', content_type='text/csv', compress=False, channel=None,
+               timeout=None):
+        """POST ``file_path`` as multipart form data, streamed from disk.
+
+        With ``compress`` the file is first gzipped to a temporary file and
+        sent as ``<name>.gz``. ``on_progress(stage, done, total)`` reports
+        ``'compress'`` (source bytes read) and then ``'upload'`` (bytes sent).
+        """
+        request = self._submit(None, channel, on_success, on_error, lambda request: self._send_upload(
+            request, path, file_path, params, field, content_type, compress, timeout
+        ))
+        request.on_progress = on_progress
+        return request
+
+    def cancel(self, channel):
+        request = self._channels.get(channel)
+        if request is not None:
+            request.cancel()
+
+    def shutdown(self):
+        for request in list(self._inflight.values()) + list(self._channels.values()):
+            request.cancel()
+        self.pool.waitForDone(2000)
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _request(self, method, url, **kwargs):
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout):
+            self._set_offline(True)
+            raise
+        self._set_offline(False)
+        return response
+
+    def _set_offline(self, offline):
+        if offline != self.offline:
+            self.offline = offline
+            self.connectivity_changed.emit(offline)
+
+    def _send_get(self, request, path, params, timeout, parse, cache, shown, version=None):
+        url = self.url(path)
+        cached = None
+        if cache is not None:
+            cache_key = self.cache.key(url, params)
+            if cache == 'immutable' and version is not None:
+                # The same URL can name different data after a server reset,
+                # so immutable bodies are only trusted for the same version.
+                cache_key = f'{cache_key}#version={version}'
+            cached = self.cache.get(cache_key)
+            if cached is not None and cache == 'immutable' and version is not None:
+                return self._decode(cached.body, parse)
+
+        headers = {'If-None-Match': cached.etag} if cached is not None and cached.etag else None
+        try:
+            response = self._request('GET', url, params=params, headers=headers, stream=True,
+                                     timeout=timeout or self.timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if cached is None:
+                raise
+            return UNCHANGED if shown else self._decode(cached.body, parse)
+
+        with response:
+            if response.status_code == 304 and cached is not None:
+                return UNCHANGED if shown else self._decode(cached.body, parse)
+            self._read_body(request, response)
+        result = self._parse(response, parse)
+        if cache is not None:
+            # Bodies without an ETag are still kept for offline use.
+            self.cache.put(cache_key, response.headers.get('ETag'), response.content)
+        return result
+
+    def _send_download(self, request, path, file_path, params, timeout):
+        url = self.url(path)
+        cache_key = self.cache.key(url, params) if self.cache is not None else None
+        previous = self.cache.get_download(cache_key) if cache_key is not None else None
+        headers = None
+        if previous is not None and previous.etag and _same_file(previous.path, previous.size):
+            headers = {'If-None-Match': previous.etag}
+
+        response = self._request('GET', url, params=params, headers=headers, stream=True,
+                                 timeout=timeout or self.timeout)
+        with response:
+            self._track(request, response)
+            if response.status_code == 304 and headers is not None:
+                # Already downloaded this version; copy it if saved elsewhere.
+                if os.path.abspath(previous.path) != os.path.abspath(file_path):
+                    shutil.copyfile(previous.path, file_path)
+                size = os.path.getsize(file_path)
+                self._signals.progress.emit(request, (size, size))
+                return file_path
+            if response.status_code >= 400:
+                self._parse(response, 'json')
+
+            total = int(response.headers.get('Content-Length') or 0)
+            partial = f'{file_path}.part'
+            try:
+                with open(partial, 'wb') as f:
+                    for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                        if request.cancelled:
+                            raise RuntimeError('cancelled')
+                        f.write(chunk)
+                        self._signals.progress.emit(request, (response.raw.tell(), total))
+                os.replace(partial, file_path)
+            except BaseException:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                raise
+
+        etag = response.headers.get('ETag')
+        if cache_key is not None and etag:
+            self.cache.put_download(cache_key, etag, file_path, os.path.getsize(file_path))
+        return file_path
+
+    def _track(self, request, response):
+        request.response = response
+        # _cancel may have run before the response was registered.
+        if request.cancelled:
+            raise RuntimeError('cancelled')
+
+    def _read_body(self, request, response):
+        """Read a streamed body in chunks, stopping once ``request`` is cancelled."""
+        self._track(request, response)
+        chunks = []
+        try:
+            for chunk in response.iter_content(READ_CHUNK_SIZE):
+                if request.cancelled:
+                    raise RuntimeError('cancelled')
+                chunks.append(chunk)
+        except Exception:
+            # Closing the response from _cancel makes the read fail.
+            if request.cancelled:
+                raise RuntimeError('cancelled')
+            raise
+        finally:
+            request.response = None
+        # Lets response.content and response.json() use the body read here.
+        response._content = b''.join(chunks)
+
+    def _send_upload(self, request, path, file_path, params, field, content_type, compress, timeout):
+        filename = os.path.basename(file_path)
+        compressed = None
+        try:
+            if compress:
+                compressed = self._gzip_file(request, file_path)
+                file_path, filename, content_type = compressed, f'{filename}.gz', 'application/gzip'
+
+            def report(sent, total):
+                if request.cancelled:
+                    raise RuntimeError('cancelled')
+                self._signals.progress.emit(request, ('upload', sent, total))
+
+            with open(file_path, 'rb') as f:
+                body = MultipartBody(field, filename, content_type, f, os.path.getsize(file_path),
+                                     on_read=report)
+                response = self._request('POST', self.url(path), params=params, data=body,
+                                         headers={'Content-Type': body.content_type},
+                                         timeout=timeout or self.timeout)
+            return self._parse(response, 'json')
+        finally:
+            if compressed is not None:
+                os.remove(compressed)
+
+    def _gzip_file(self, request, file_path):
+        total = os.path.getsize(file_path)
+        handle, compressed = tempfile.mkstemp(suffix='.gz')
+        try:
+            with open(file_path, 'rb') as source, os.fdopen(handle, 'wb') as target, \
+                    gzip.GzipFile(fileobj=target, mode='wb', compresslevel=UPLOAD_GZIP_LEVEL) as gz:
+                done = 0
+                while chunk := source.read(UPLOAD_CHUNK_SIZE):
+                    if request.cancelled:
+                        raise RuntimeError('cancelled')
+                    gz.write(chunk)
+                    done += len(chunk)
+                    self._signals.progress.emit(request, ('compress', done, total))
+        except BaseException:
+            os.remove(compressed)
+            raise
+        return compressed
+
+    def _submit(self, key, channel, on_success, on_error, send):
+        if key is not None and key in self._inflight:
+            request = self._inflight[key]
+        else:
+            request = ApiRequest(self, key, channel)
+            request.runnable = _Worker(request, send, self._signals)
+            if key is not None:
+                self._inflight[key] = request
+            self.pool.start(request.runnable)
+
+        if channel is not None:
+            previous = self._channels.get(channel)
+            if previous is not None and previous is not request:
+                previous.cancel()
+            self._channels[channel] = request
+            request.channel = channel
+
+        request.callbacks.append((on_success, on_error))
+        return request
+
+    def _cancel(self, request):
+        request.cancelled = True
+        if request.runnable is not None and self.pool.tryTake(request.runnable):
+            request.runnable = None
+        response = request.response
+        if response is not None:
+            # Drops the connection instead of reading a body nobody wants.
+            response.close()
+        self._forget(request)
+
+    def _forget(self, request):
+        if request.key is not None and self._inflight.get(request.key) is request:
+            del self._inflight[request.key]
+        if request.channel is not None and self._channels.get(request.channel) is request:
+            del self._channels[request.channel]
+
+    def _on_succeeded(self, request, result):
+        self._forget(request)
+        request.runnable = None
+        if request.cancelled or result is UNCHANGED:
+            return
+        for on_success, _ in request.callbacks:
+            if on_success is not None:
+                on_success(result)
+
+    def _on_failed(self, request, message):
+        self._forget(request)
+        request.runnable = None
+        if request.cancelled:
+            return
+        for _, on_error in request.callbacks:
+            if on_error is not None:
+                on_error(message)
+
+    def _on_progress(self, request, args):
+        if not request.cancelled and request.on_progress is not None:
+            request.on_progress(*args)
+
+    @staticmethod
+    def _decode(body, parse):
+        return body if parse == 'bytes' else json_module.loads(body)
+
+    @staticmethod
+    def _parse(response, parse):
+        if response.status_code >= 400:
+            try:
+                body = response.json()
+                message = body.get('error') or body.get('detail') or 'Request failed'
+            except ValueError:
+                message = f'Request failed ({response.status_code})'
+            raise RuntimeError(message)
+        if parse == 'bytes':
+            return response.content
+        return response.json()
+
+
+class MultipartBody:
+    """Read-only file object that yields a multipart/form-data body.
+
+    Only the small header and trailer live in memory; the file part is read
+    from ``fileobj`` as the HTTP library asks for it. ``len()`` gives the
+    exact body size so the request carries a Content-Length.
+    """
+
+    def __init__(self, field, filename, content_type, fileobj, size, on_read=None):
+        boundary = uuid.uuid4().hex
+        filename = filename.replace('"', '%22')
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self._head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self._tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self._parts = [self._head, fileobj, self._tail]
+        self._length = len(self._head) + size + len(self._tail)
+        self._sent = 0
+        self._reported = 0
+        self._on_read = on_read
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+        while size > 0 and self._parts:
+            part = self._parts[0]
+            if isinstance(part, bytes):
+                chunk, self._parts[0] = part[:size], part[size:]
+                if not self._parts[0]:
+                    self._parts.pop(0)
+            else:
+                chunk = part.read(size)
+                if not chunk:
+                    self._parts.pop(0)
+                    continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        data = b''.join(chunks)
+        self._sent += len(data)
+        if data and self._on_read is not None and (
+            self._sent - self._reported >= UPLOAD_PROGRESS_STEP or self._sent == self._length
+        ):
+            self._reported = self._sent
+            self._on_read(self._sent, self._length)
+        return data
+
+
+def _same_file(path, size):
+    try:
+        return os.path.getsize(path) == size
+    except OSError:
+        return False
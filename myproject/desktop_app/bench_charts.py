@@ -0,0 +1,108 @@
+"""Time the flowrate/pressure chart on a large synthetic dataset.
+
+Compares plotting every point with matplotlib against ChartWidget's
+decimated path, for the first render and for a zoom into 1% of the rows.
+Exits non-zero if a decimated render takes longer than --max-ms.
+
+    python bench_charts.py --points 1000000
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from charts import ChartWidget, minmax_decimate
+
+
+def synthetic_series(points, seed=0):
+    rng = np.random.default_rng(seed)
+    flowrate = 100 + np.cumsum(rng.normal(0, 1, points))
+    pressure = 5 + np.sin(np.linspace(0, 60, points)) + rng.normal(0, 0.2, points)
+    return {'flowrate': flowrate, 'pressure': pressure}
+
+
+def time_full_plot(series, width, height):
+    figure = Figure(figsize=(width / 100, height / 100), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    started = time.perf_counter()
+    ax = figure.add_subplot(111)
+    ax2 = ax.twinx()
+    ax.plot(series['flowrate'], 'b-', linewidth=1)
+    ax2.plot(series['pressure'], 'r-', linewidth=1)
+    canvas.draw()
+    return time.perf_counter() - started
+
+
+def wait_for_chart(app, chart):
+    while chart._task is not None or chart._pending is not None or chart._redecimate_timer.isActive():
+        app.processEvents()
+        time.sleep(0.001)
+    app.processEvents()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, default=1000000)
+    parser.add_argument('--width', type=int, default=800)
+    parser.add_argument('--height', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-full', action='store_true',
+                        help='Skip the slow plot-every-point baseline.')
+    parser.add_argument('--max-ms', type=float, default=500.0,
+                        help='Fail if a decimated render exceeds this many milliseconds.')
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    series = synthetic_series(args.points)
+    x = np.arange(args.points, dtype=np.float64)
+
+    started = time.perf_counter()
+    for column in series.values():
+        minmax_decimate(x, column, args.width)
+    decimate = time.perf_counter() - started
+
+    chart = ChartWidget(interactive=True)
+    chart.resize(args.width, args.height)
+    chart.show()
+    app.processEvents()
+
+    first, zoom = [], []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        chart.plot_flowrate_pressure(series)
+        wait_for_chart(app, chart)
+        chart.canvas.draw()
+        first.append(time.perf_counter() - started)
+
+        centre = args.points // 2
+        span = max(args.points // 200, 1)
+        started = time.perf_counter()
+        chart._axes[0].set_xlim(centre - span, centre + span)
+        chart.canvas.draw()
+        chart._redecimate_timer.stop()
+        chart._decimate_visible()
+        wait_for_chart(app, chart)
+        zoom.append(time.perf_counter() - started)
+
+    points_drawn = sum(len(line.get_xdata()) for line in chart._lines)
+    print(f'points:                 {args.points}')
+    print(f'min/max decimation:     {decimate * 1000:.1f} ms for both columns')
+    print(f'decimated first render: {min(first) * 1000:.1f} ms')
+    print(f'decimated zoom (1%):    {min(zoom) * 1000:.1f} ms, {points_drawn} points drawn')
+    if not args.skip_full:
+        full = time_full_plot(series, args.width, args.height)
+        print(f'plot every point:       {full * 1000:.1f} ms')
+
+    worst = max(min(first), min(zoom)) * 1000
+    if worst > args.max_ms:
+        print(f'FAIL: decimated render took {worst:.1f} ms, above {args.max_ms:.1f} ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
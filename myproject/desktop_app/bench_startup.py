@@ -0,0 +1,155 @@
+"""Measure desktop start-up cost and fail when it regresses.
+
+Each run starts a fresh interpreter: one with ``-X importtime`` importing
+``main``, one timing QApplication plus MainWindow up to where the login
+dialog would open. Medians are compared with startup_baseline.json after
+scaling the baseline by a calibration run (a fresh interpreter importing
+CALIBRATION_MODULES) on both machines, and the start-up run must not have
+imported any of HEAVY_MODULES. The baseline records the environment it
+was taken in; a differing one is reported, since scaling is approximate.
+
+    python bench_startup.py                     # compare with the baseline
+    python bench_startup.py --update-baseline   # record new numbers
+
+The Django test suite runs the comparison too (equipment.tests
+DesktopStartupTests) when PyQt5 is installed.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(APP_DIR, 'startup_baseline.json')
+HEAVY_MODULES = ('matplotlib', 'numpy', 'pandas')
+# Standard-library imports whose cost tracks interpreter and disk speed.
+CALIBRATION_MODULES = 'decimal, email.message, http.client, json, unittest, xml.dom.minidom'
+
+STARTUP_SCRIPT = '''
+import json, sys, time
+started = time.perf_counter()
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+import main
+main.MainWindow.show_login = lambda self: None
+window = main.MainWindow()
+window.show()
+app.processEvents()
+elapsed = time.perf_counter() - started
+print(json.dumps({'startup_ms': elapsed * 1000, 'modules': sorted(sys.modules)}))
+'''
+
+
+def _run(args):
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return subprocess.run([sys.executable] + args, cwd=APP_DIR, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def import_time_ms():
+    stderr = _run(['-X', 'importtime', '-c', 'import main']).stderr
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, cumulative, name = line.split('|')
+        if name.strip() == 'main':
+            return int(cumulative) / 1000
+    raise RuntimeError('main was not found in -X importtime output')
+
+
+def startup():
+    return json.loads(_run(['-c', STARTUP_SCRIPT]).stdout.strip().splitlines()[-1])
+
+
+def calibration_ms(runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        _run(['-c', f'import {CALIBRATION_MODULES}'])
+        samples.append((time.perf_counter() - started) * 1000)
+    # The fastest run is the least disturbed by other load.
+    return round(min(samples), 1)
+
+
+def environment():
+    from PyQt5.QtCore import PYQT_VERSION_STR, QT_VERSION_STR
+    return {
+        'python': platform.python_version(),
+        'system': platform.system(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'pyqt': PYQT_VERSION_STR,
+        'qt': QT_VERSION_STR,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown over the calibration-scaled baseline, '
+                             'as a fraction.')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    imports = [import_time_ms() for _ in range(args.runs)]
+    runs = [startup() for _ in range(args.runs)]
+    timings = {
+        'import_ms': round(statistics.median(imports), 1),
+        'startup_ms': round(statistics.median(run['startup_ms'] for run in runs), 1),
+    }
+    result = {
+        'environment': environment(),
+        'calibration_ms': calibration_ms(args.runs * 2),
+        **timings,
+    }
+    loaded = {name.split('.')[0] for run in runs for name in run['modules']}
+    heavy = sorted(loaded.intersection(HEAVY_MODULES))
+
+    print(f'import main:    {result["import_ms"]:.1f} ms (median of {args.runs})')
+    print(f'window ready:   {result["startup_ms"]:.1f} ms (median of {args.runs})')
+    print(f'heavy modules:  {", ".join(heavy) or "none"}')
+    print(f'calibration:    {result["calibration_ms"]:.1f} ms (fastest of {args.runs * 2})')
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    failures = [f'{name} imported at start-up' for name in heavy]
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        scale = result['calibration_ms'] / baseline['calibration_ms']
+        print(f'baseline timings scaled x{scale:.2f} by calibration')
+        changed = sorted(key for key, value in result['environment'].items()
+                         if baseline['environment'].get(key) != value)
+        if changed:
+            print('note: environment differs from the baseline (' + ', '.join(
+                f'{key}: {baseline["environment"].get(key)} -> {result["environment"][key]}'
+                for key in changed
+            ) + '); comparisons are approximate')
+        for key, value in timings.items():
+            limit = baseline[key] * scale * (1 + args.tolerance)
+            print(f'{key}: {value:.1f} ms vs baseline {baseline[key]:.1f} ms (limit {limit:.1f} ms)')
+            if value > limit:
+                failures.append(f'{key} {value:.1f} ms exceeds {limit:.1f} ms')
+    else:
+        print('No baseline yet; run with --update-baseline to record one.')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Time how long the last of several rapid dataset switches takes to arrive.
+
+A local HTTP server sends each data page over --page-ms, like a large
+page on a slow link. The benchmark clicks through --switches datasets on
+one ApiClient channel, --gap-ms apart, and reports the time from the last
+click until its page is delivered, next to how long one page takes alone.
+With the defaults the stale pages occupy every worker when the last click
+lands. Exits non-zero if the last switch takes more than --max-ratio times
+one page.
+
+    python bench_switching.py --switches 5 --page-ms 2000
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtWidgets import QApplication
+
+from api_client import ApiClient
+
+
+class SlowPageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    chunks = 40
+    chunk_size = 64 * 1024
+    chunk_delay = 0.05
+
+    def do_GET(self):
+        body = b'[' + b' ' * (self.chunk_size - 2) + b']'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str((len(body) + 1) * self.chunks + 1))
+        self.end_headers()
+        self.wfile.write(b'[')
+        for index in range(self.chunks):
+            self.wfile.write(body)
+            self.wfile.write(b',' if index + 1 < self.chunks else b']')
+            self.wfile.flush()
+            time.sleep(self.chunk_delay)
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # A cancelled request closed its connection.
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def wait(app, done, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while not done.is_set():
+        if time.perf_counter() > deadline:
+            raise TimeoutError('no response')
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def switch(app, client, switches, gap):
+    done = threading.Event()
+    for dataset_id in range(1, switches + 1):
+        last = dataset_id == switches
+        clicked = time.perf_counter()
+        client.get(f'data/{dataset_id}/', channel='dataset',
+                   on_success=(lambda _data: done.set()) if last else None)
+        if not last:
+            until = clicked + gap
+            while time.perf_counter() < until:
+                app.processEvents()
+                time.sleep(0.001)
+    wait(app, done)
+    return time.perf_counter() - clicked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--switches', type=int, default=5)
+    parser.add_argument('--gap-ms', type=float, default=100.0)
+    parser.add_argument('--page-ms', type=float, default=2000.0,
+                        help='How long the server takes to send one page.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-ratio', type=float, default=1.5,
+                        help='Fail if the last switch takes this many times one page.')
+    args = parser.parse_args()
+
+    SlowPageHandler.chunk_delay = args.page_ms / 1000 / SlowPageHandler.chunks
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowPageHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    app = QApplication.instance() or QApplication(sys.argv)
+    client = ApiClient(f'http://127.0.0.1:{server.server_port}')
+    try:
+        single = min(switch(app, client, 1, 0) for _ in range(args.repeat))
+        last = min(switch(app, client, args.switches, args.gap_ms / 1000)
+                   for _ in range(args.repeat))
+    finally:
+        client.shutdown()
+        server.shutdown()
+
+    print(f'one page alone:          {single * 1000:.0f} ms')
+    print(f'last of {args.switches} switches:     {last * 1000:.0f} ms '
+          f'({args.gap_ms:.0f} ms apart, {client.pool.maxThreadCount()} workers)')
+    if last > single * args.max_ratio:
+        print(f'FAIL: last switch took {last / single:.1f}x one page, above {args.max_ratio}x')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
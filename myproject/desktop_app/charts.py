@@ -0,0 +1,255 @@
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QVBoxLayout, QWidget
+from matplotlib.backends.backend_qt5agg import (
+    FigureCanvasQTAgg as FigureCanvas, NavigationToolbar2QT as NavigationToolbar
+)
+from matplotlib.figure import Figure
+
+
+# Re-decimate this long after the last pan/zoom step.
+REDECIMATE_DELAY_MS = 60
+MIN_BINS = 100
+
+LINE_SERIES = (
+    ('flowrate', 'Flowrate', 'b'),
+    ('pressure', 'Pressure', 'r'),
+)
+
+
+def minmax_decimate(x, y, bins):
+    """Reduce ``y`` to the minimum and maximum of each of ``bins`` equal runs.
+
+    Drawn ``bins`` pixels wide the result covers the same pixels as the full
+    series, so spikes survive however many points are dropped.
+    """
+    count = len(y)
+    if count <= 2 * bins:
+        return np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+    starts = np.linspace(0, count, bins, endpoint=False).astype(np.int64)
+    decimated = np.empty(2 * bins, dtype=np.float64)
+    decimated[0::2] = np.fmin.reduceat(y, starts)
+    decimated[1::2] = np.fmax.reduceat(y, starts)
+    return np.repeat(x[starts], 2).astype(np.float64), decimated
+
+
+def visible_range(x, low, high):
+    # One extra point on each side keeps lines running off the plot edges.
+    start = max(int(np.searchsorted(x, low, side='left')) - 1, 0)
+    stop = min(int(np.searchsorted(x, high, side='right')) + 1, len(x))
+    return start, stop
+
+
+class _DecimationSignals(QObject):
+    finished = pyqtSignal(int, object)
+
+
+class _DecimationTask(QRunnable):
+    def __init__(self, generation, x, columns, x_range, bins, signals):
+        super().__init__()
+        # The chart keeps this alive until ``finished`` is delivered.
+        self.setAutoDelete(False)
+        self.generation = generation
+        self.x = x
+        self.columns = columns
+        self.x_range = x_range
+        self.bins = bins
+        self.signals = signals
+
+    def run(self):
+        start, stop = 0, len(self.x)
+        if self.x_range is not None:
+            start, stop = visible_range(self.x, *self.x_range)
+        x = self.x[start:stop]
+        lines = [minmax_decimate(x, column[start:stop], self.bins) for column in self.columns]
+        self.signals.finished.emit(self.generation, lines)
+
+
+class ChartWidget(QWidget):
+    """One matplotlib chart.
+
+    ``plot_flowrate_pressure`` keeps its line artists between updates and
+    only ever draws a min/max decimation of the data sized to the axes'
+    pixel width. Decimation runs on a worker thread and is redone for the
+    visible range after each pan or zoom; finished lines are blitted over a
+    cached background instead of redrawing the whole figure.
+    """
+
+    def __init__(self, parent=None, interactive=False):
+        super().__init__(parent)
+        self.figure = Figure(figsize=(8, 6))
+        self.canvas = FigureCanvas(self.figure)
+
+        self.toolbar = NavigationToolbar(self.canvas, self) if interactive else None
+
+        layout = QVBoxLayout()
+        if self.toolbar is not None:
+            layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+        self._bars = None
+        self._axes = None
+        self._lines = []
+        self._x = None
+        self._columns = []
+        self._background = None
+        self._generation = 0
+        self._task = None
+        self._pending = None
+        self._reset_limits = False
+        self._signals = _DecimationSignals()
+        self._signals.finished.connect(self._on_decimated)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._redecimate_timer = QTimer(self)
+        self._redecimate_timer.setSingleShot(True)
+        self._redecimate_timer.setInterval(REDECIMATE_DELAY_MS)
+        self._redecimate_timer.timeout.connect(self._decimate_visible)
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.mpl_connect('resize_event', lambda _event: self._redecimate_timer.start())
+
+    def plot_type_distribution(self, type_distribution):
+        self._reset_figure()
+        ax = self.figure.add_subplot(111)
+
+        types = list(type_distribution.keys())
+        counts = list(type_distribution.values())
+
+        # An empty dataset has no wedges, which matplotlib refuses to draw.
+        if counts:
+            ax.pie(counts, labels=types, autopct='%1.1f%%', startangle=90)
+        else:
+            ax.axis('off')
+        ax.set_title('Equipment Type Distribution')
+
+        self.canvas.draw_idle()
+
+    def plot_averages(self, averages):
+        metrics = ['Flowrate', 'Pressure', 'Temperature']
+        values = [averages['flowrate'], averages['pressure'], averages['temperature']]
+
+        if self._bars is None:
+            self._reset_figure()
+            ax = self.figure.add_subplot(111)
+            self._bars = ax.bar(metrics, values, color=['#3498db', '#e74c3c', '#2ecc71'])
+            ax.set_ylabel('Average Value')
+            ax.set_title('Average Values')
+            ax.grid(True, alpha=0.3)
+        else:
+            for bar, value in zip(self._bars, values):
+                bar.set_height(value)
+            ax = self._bars[0].axes
+            ax.relim()
+            ax.autoscale_view()
+
+        self.canvas.draw_idle()
+
+    def plot_flowrate_pressure(self, equipment_data):
+        columns = [np.asarray(equipment_data[field], dtype=np.float64) for field, _, _ in LINE_SERIES]
+        count = len(columns[0])
+        x = equipment_data.get('index')
+        x = np.arange(count, dtype=np.float64) if x is None else np.asarray(x, dtype=np.float64)
+
+        if self._axes is None:
+            self._create_line_axes()
+        self._x = x
+        self._columns = columns
+        self._axes[0].set_title(f'Flowrate vs Pressure ({count} equipment)')
+        self._reset_limits = True
+        self._request_decimation(None)
+
+    def _reset_figure(self):
+        self.figure.clear()
+        self._bars = None
+        self._axes = None
+        self._lines = []
+        self._background = None
+        self._generation += 1
+
+    def _create_line_axes(self):
+        self._reset_figure()
+        ax = self.figure.add_subplot(111)
+        ax2 = ax.twinx()
+        self._axes = (ax, ax2)
+        for axes, (_, label, color) in zip(self._axes, LINE_SERIES):
+            line, = axes.plot([], [], f'{color}-', label=label, linewidth=1, animated=True)
+            axes.set_ylabel(label, color=color)
+            self._lines.append(line)
+        ax.set_xlabel('Equipment Index')
+        ax.grid(True, alpha=0.3)
+        ax.legend(self._lines, [line.get_label() for line in self._lines], loc='upper left')
+        ax.callbacks.connect('xlim_changed', self._on_xlim_changed)
+
+    def _request_decimation(self, x_range):
+        self._generation += 1
+        if len(self._x) == 0:
+            self._show_lines([(self._x, column) for column in self._columns])
+            return
+        bins = max(int(self._axes[0].bbox.width), MIN_BINS)
+        request = (self._generation, self._x, self._columns, x_range, bins)
+        if self._task is not None:
+            # Only the newest request matters once the running one finishes.
+            self._pending = request
+            return
+        self._start_task(request)
+
+    def _start_task(self, request):
+        self._task = _DecimationTask(*request, self._signals)
+        self._pool.start(self._task)
+
+    def _decimate_visible(self):
+        if self._axes is not None and self._x is not None:
+            self._request_decimation(self._axes[0].get_xlim())
+
+    def _on_xlim_changed(self, _axes):
+        if not self._reset_limits:
+            self._redecimate_timer.start()
+
+    def _on_decimated(self, generation, lines):
+        self._task = None
+        if self._pending is not None:
+            request, self._pending = self._pending, None
+            self._start_task(request)
+        if generation == self._generation and self._axes is not None:
+            self._show_lines(lines)
+
+    def _show_lines(self, lines):
+        for line, (x, y) in zip(self._lines, lines):
+            line.set_data(x, y)
+        if self._reset_limits:
+            # New data: fit the axes, which needs a full redraw.
+            self._fit_limits(lines)
+            self._reset_limits = False
+            self.canvas.draw_idle()
+        else:
+            self._blit_lines()
+
+    def _fit_limits(self, lines):
+        if len(self._x) > 1:
+            self._axes[0].set_xlim(self._x[0], self._x[-1])
+        for axes, (_, y) in zip(self._axes, lines):
+            finite = y[np.isfinite(y)]
+            if finite.size:
+                low, high = finite.min(), finite.max()
+                pad = (high - low) * 0.05 or 1.0
+                axes.set_ylim(low - pad, high + pad)
+        if self.toolbar is not None:
+            # Make "Home" return to the new full view.
+            self.toolbar.update()
+
+    def _on_draw(self, _event):
+        if not self._lines:
+            return
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        for line in self._lines:
+            line.axes.draw_artist(line)
+
+    def _blit_lines(self):
+        if self._background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        for line in self._lines:
+            line.axes.draw_artist(line)
+        self.canvas.blit(self.figure.bbox)
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from PyQt5.QtCore import QStandardPaths
+
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+CachedResponse = namedtuple('CachedResponse', ['etag', 'body'])
+CachedDownload = namedtuple('CachedDownload', ['etag', 'path', 'size'])
+
+
+def default_cache_path():
+    base = QStandardPaths.writableLocation(QStandardPaths.GenericCacheLocation)
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'equipment-visualizer', 'responses.sqlite3')
+
+
+class DatasetCache:
+    """SQLite store of API response bodies with their ETags.
+
+    Entries are keyed by URL plus query parameters and evicted least recently
+    used first once the stored bodies exceed ``max_bytes``. Streamed
+    downloads only record where they were saved and their ETag. Safe to use
+    from the API client's worker threads.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, etag TEXT, body BLOB NOT NULL,'
+            ' size INTEGER NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS downloads ('
+            ' key TEXT PRIMARY KEY, etag TEXT NOT NULL, path TEXT NOT NULL, size INTEGER NOT NULL)'
+        )
+        self._db.commit()
+
+    @staticmethod
+    def key(url, params=None):
+        if not params:
+            return url
+        query = '&'.join(f'{name}={value}' for name, value in sorted(params.items()))
+        return f'{url}?{query}'
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT etag, body FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute(
+                'UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key)
+            )
+            self._db.commit()
+        return CachedResponse(row[0], bytes(row[1]))
+
+    def put(self, key, etag, body):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses (key, etag, body, size, last_access) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, etag, sqlite3.Binary(body), len(body), time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def get_download(self, key):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT etag, path, size FROM downloads WHERE key = ?', (key,)
+            ).fetchone()
+        return None if row is None else CachedDownload(*row)
+
+    def put_download(self, key, etag, path, size):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO downloads (key, etag, path, size) VALUES (?, ?, ?, ?)',
+                (key, etag, os.path.abspath(path), size)
+            )
+            self._db.commit()
+
+    def size(self):
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute('DELETE FROM responses')
+            self._db.execute('DELETE FROM downloads')
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute(
+            'SELECT key, size FROM responses ORDER BY last_access'
+        ).fetchall():
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
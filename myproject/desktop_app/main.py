@@ -1,24 +1,46 @@
 import sys
 import os
+import json
+import importlib
+import threading
 import requests
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QLabel, QFileDialog, QTableWidget, QTableWidgetItem,
+    QPushButton, QLabel, QFileDialog, QTableView, QHeaderView,
     QMessageBox, QLineEdit, QDialog, QDialogButtonBox, QFormLayout,
-    QGroupBox, QListWidget
+    QGroupBox, QListWidget, QProgressDialog
 )
-from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QFont
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
+
+from api_client import ApiClient
+from dataset_cache import DatasetCache
 
 
 API_BASE_URL = 'http://localhost:8000/api/equipment'
+UPLOAD_TIMEOUT = (5, 300)
+PDF_TIMEOUT = (5, 300)
+# Smaller CSVs are sent as-is; compressing them saves too little to matter.
+UPLOAD_COMPRESS_MIN_BYTES = 1024 * 1024
+UPLOAD_STAGES = {'compress': 'Compressing CSV...', 'upload': 'Uploading...'}
+TABLE_PAGE_SIZE = 5000
+# Progress dialogs count in per mille: QProgressDialog takes a C int, so
+# byte counts of 2 GiB and up cannot be passed to it directly.
+PROGRESS_STEPS = 1000
+# Pull in numpy and matplotlib only once there is data to show; they are
+# imported in the background after login so the first dataset opens fast.
+LAZY_MODULES = ('table_model', 'charts')
+
+
+def preload_modules():
+    for name in LAZY_MODULES:
+        importlib.import_module(name)
 
 
 class LoginDialog(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, client, parent=None):
         super().__init__(parent)
+        self.client = client
         self.setWindowTitle('Login')
         self.setModal(True)
         self.resize(300, 200)
@@ -68,115 +90,102 @@ class LoginDialog(QDialog):
             QMessageBox.warning(self, 'Error', 'Username and password are required')
             return
         
-        try:
-            endpoint = 'auth/register/' if self.is_register else 'auth/login/'
-            data = {'username': username, 'password': password}
-            if self.is_register and email:
-                data['email'] = email
-            
-            response = requests.post(f'{API_BASE_URL}/{endpoint}', json=data)
-            
-            if response.status_code in [200, 201]:
-                self.token = response.json().get('token')
+        endpoint = 'auth/register/' if self.is_register else 'auth/login/'
+        data = {'username': username, 'password': password}
+        if self.is_register and email:
+            data['email'] = email
+        
+        self.login_button.setEnabled(False)
+        self.client.post(endpoint, json=data, on_success=self.on_authenticated,
+                         on_error=self.on_auth_error)
+    
+    def on_authenticated(self, data):
+        self.login_button.setEnabled(True)
+        self.token = data.get('token')
+        super().accept()
+    
+    def on_auth_error(self, message):
+        self.login_button.setEnabled(True)
+        if self.client.offline and self.client.cache is not None:
+            answer = QMessageBox.question(
+                self, 'Server unreachable',
+                f'{message}\n\nBrowse previously viewed datasets offline?'
+            )
+            if answer == QMessageBox.Yes:
+                self.token = None
                 super().accept()
-            else:
-                error_msg = response.json().get('error', 'Authentication failed')
-                QMessageBox.warning(self, 'Error', error_msg)
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', f'Connection error: {str(e)}')
+            return
+        QMessageBox.warning(self, 'Error', message)
 
 
-class ApiThread(QThread):
-    finished = pyqtSignal(dict)
-    error = pyqtSignal(str)
+class EventStreamThread(QThread):
+    event_received = pyqtSignal(str, dict)
+    # The server cannot stream events (e.g. runserver/WSGI); don't retry.
+    unsupported = pyqtSignal()
+    # The token was rejected; retrying cannot succeed until a new login.
+    unauthorized = pyqtSignal()
+    # The stream is open; True when it was opened again after a drop, in
+    # which case events sent while disconnected are lost.
+    connected = pyqtSignal(bool)
     
-    def __init__(self, method, url, headers=None, data=None, files=None):
+    def __init__(self, url, token):
         super().__init__()
-        self.method = method
         self.url = url
-        self.headers = headers or {}
-        self.data = data
-        self.files = files
+        self.token = token
+        self._stopped = False
+        self._wake = threading.Event()
+        self._response = None
     
-    def run(self):
-        try:
-            if self.method == 'GET':
-                response = requests.get(self.url, headers=self.headers)
-            elif self.method == 'POST':
-                if self.files:
-                    response = requests.post(self.url, headers=self.headers, files=self.files)
-                else:
-                    response = requests.post(self.url, headers=self.headers, json=self.data)
-            
-            if response.status_code < 400:
-                self.finished.emit(response.json())
-            else:
-                error_msg = response.json().get('error', 'Request failed')
-                self.error.emit(error_msg)
-        except Exception as e:
-            self.error.emit(str(e))
-
-
-class ChartWidget(QWidget):
-    def __init__(self, parent=None):
-        super().__init__(parent)
-        self.figure = Figure(figsize=(8, 6))
-        self.canvas = FigureCanvas(self.figure)
-        
-        layout = QVBoxLayout()
-        layout.addWidget(self.canvas)
-        self.setLayout(layout)
-    
-    def plot_type_distribution(self, type_distribution):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        
-        types = list(type_distribution.keys())
-        counts = list(type_distribution.values())
-        
-        ax.pie(counts, labels=types, autopct='%1.1f%%', startangle=90)
-        ax.set_title('Equipment Type Distribution')
-        
-        self.canvas.draw()
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+        response = self._response
+        if response is not None:
+            response.close()
     
-    def plot_averages(self, averages):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        
-        metrics = ['Flowrate', 'Pressure', 'Temperature']
-        values = [averages['flowrate'], averages['pressure'], averages['temperature']]
-        
-        ax.bar(metrics, values, color=['#3498db', '#e74c3c', '#2ecc71'])
-        ax.set_ylabel('Average Value')
-        ax.set_title('Average Values')
-        ax.grid(True, alpha=0.3)
-        
-        self.canvas.draw()
-    
-    def plot_flowrate_pressure(self, equipment_data):
-        self.figure.clear()
-        ax = self.figure.add_subplot(111)
-        
-        flowrates = [item['flowrate'] for item in equipment_data[:20]]
-        pressures = [item['pressure'] for item in equipment_data[:20]]
-        indices = list(range(len(flowrates)))
-        
-        ax2 = ax.twinx()
-        
-        line1 = ax.plot(indices, flowrates, 'b-', label='Flowrate', linewidth=2)
-        line2 = ax2.plot(indices, pressures, 'r-', label='Pressure', linewidth=2)
-        
-        ax.set_xlabel('Equipment Index')
-        ax.set_ylabel('Flowrate', color='b')
-        ax2.set_ylabel('Pressure', color='r')
-        ax.set_title('Flowrate vs Pressure (First 20 Equipment)')
-        ax.grid(True, alpha=0.3)
-        
-        lines = line1 + line2
-        labels = [l.get_label() for l in lines]
-        ax.legend(lines, labels, loc='upper left')
-        
-        self.canvas.draw()
+    def run(self):
+        delay = 1
+        reconnect = False
+        while not self._stopped:
+            try:
+                self._response = requests.get(
+                    self.url,
+                    headers={'Authorization': f'Token {self.token}', 'Accept': 'text/event-stream'},
+                    stream=True,
+                    timeout=(5, 60)
+                )
+                if self._response.status_code in (401, 403):
+                    self.unauthorized.emit()
+                    return
+                if self._response.status_code in (404, 501):
+                    self.unsupported.emit()
+                    return
+                # Other errors (e.g. 502 from a restarting proxy) keep backing off.
+                self._response.raise_for_status()
+                delay = 1
+                self.connected.emit(reconnect)
+                reconnect = True
+                event_type, data_lines = 'message', []
+                for line in self._response.iter_lines(decode_unicode=True):
+                    if self._stopped:
+                        break
+                    if not line:
+                        if data_lines:
+                            self.event_received.emit(event_type, json.loads('\n'.join(data_lines)))
+                        event_type, data_lines = 'message', []
+                    elif line.startswith('event:'):
+                        event_type = line[6:].strip()
+                    elif line.startswith('data:'):
+                        data_lines.append(line[5:].strip())
+            except Exception:
+                pass
+            finally:
+                if self._response is not None:
+                    self._response.close()
+                    self._response = None
+            if not self._stopped:
+                self._wake.wait(delay)
+                delay = min(delay * 2, 30)
 
 
 class MainWindow(QMainWindow):
@@ -185,38 +194,17 @@ class MainWindow(QMainWindow):
         self.token = None
         self.current_dataset_id = None
         self.summary = None
-        self.equipment_data = []
+        self.equipment_data = {}
         self.history = []
-        self._threads = set()
+        self.client = ApiClient(API_BASE_URL, cache=DatasetCache(), parent=self)
+        self.client.connectivity_changed.connect(self.on_connectivity_changed)
+        self.table_model = None
+        self.charts = None
+        self.event_thread = None
+        self.stopping_threads = set()
         
         self.init_ui()
         self.show_login()
-
-    def _cleanup_thread(self, thread: QThread):
-        self._threads.discard(thread)
-        thread.deleteLater()
-
-    def _run_thread(self, thread: QThread, on_success=None):
-        self._threads.add(thread)
-
-        if on_success is not None:
-            def _handle_success(data, t=thread):
-                try:
-                    on_success(data)
-                finally:
-                    self._cleanup_thread(t)
-            thread.finished.connect(_handle_success)
-        else:
-            thread.finished.connect(lambda _data, t=thread: self._cleanup_thread(t))
-
-        def _handle_error(message, t=thread):
-            try:
-                self.show_error(message)
-            finally:
-                self._cleanup_thread(t)
-        thread.error.connect(_handle_error)
-
-        thread.start()
     
     def init_ui(self):
         self.setWindowTitle('Chemical Equipment Parameter Visualizer')
@@ -268,31 +256,38 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(summary_group)
         
         charts_group = QGroupBox('Visualizations')
-        charts_layout = QHBoxLayout()
-        
-        self.chart1 = ChartWidget()
-        self.chart2 = ChartWidget()
-        self.chart3 = ChartWidget()
-        
-        charts_layout.addWidget(self.chart1)
-        charts_layout.addWidget(self.chart2)
-        charts_layout.addWidget(self.chart3)
-        
-        charts_group.setLayout(charts_layout)
+        self.charts_layout = QHBoxLayout()
+        self.charts_placeholder = QLabel('Charts appear when a dataset is loaded')
+        self.charts_placeholder.setAlignment(Qt.AlignCenter)
+        self.charts_layout.addWidget(self.charts_placeholder)
+        charts_group.setLayout(self.charts_layout)
         main_layout.addWidget(charts_group)
         
-        table_group = QGroupBox('Equipment Data')
+        self.table_group = QGroupBox('Equipment Data')
         table_layout = QVBoxLayout()
-        self.table = QTableWidget()
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText('Filter by name or type')
+        self.filter_input.textChanged.connect(self.on_filter_changed)
+        table_layout.addWidget(self.filter_input)
+        self.table = QTableView()
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.setSortingEnabled(True)
         table_layout.addWidget(self.table)
-        table_group.setLayout(table_layout)
-        main_layout.addWidget(table_group)
+        self.table_group.setLayout(table_layout)
+        main_layout.addWidget(self.table_group)
     
     def show_login(self):
-        dialog = LoginDialog(self)
+        self.stop_events()
+        dialog = LoginDialog(self.client, self)
         if dialog.exec_() == QDialog.Accepted:
             self.token = dialog.token
+            self.client.set_token(self.token)
             self.load_history()
+            if self.token:
+                self.start_events()
+            threading.Thread(target=preload_modules, daemon=True).start()
         else:
             if not self.token:
                 sys.exit()
@@ -307,28 +302,101 @@ class MainWindow(QMainWindow):
             self.upload_file(file_path)
     
     def upload_file(self, file_path):
-        headers = {'Authorization': f'Token {self.token}'}
-        with open(file_path, 'rb') as f:
-            content = f.read()
-        files = {'file': (os.path.basename(file_path), content, 'text/csv')}
-
-        thread = ApiThread('POST', f'{API_BASE_URL}/upload/', headers=headers, files=files)
-        self._run_thread(thread, on_success=self.on_upload_success)
+        self.upload_button.setEnabled(False)
+        self.upload_progress = self.start_progress('Upload CSV File', 'Uploading...', self.cancel_upload)
+        self.client.upload(
+            'upload/', file_path, params={'rows': 0}, channel='upload', timeout=UPLOAD_TIMEOUT,
+            compress=os.path.getsize(file_path) >= UPLOAD_COMPRESS_MIN_BYTES,
+            on_progress=self.on_upload_progress, on_success=self.on_upload_success,
+            on_error=self.on_upload_error
+        )
+    
+    def on_upload_progress(self, stage, done, total):
+        self.upload_progress.setLabelText(UPLOAD_STAGES[stage])
+        self.set_progress(self.upload_progress, done, total)
+    
+    def cancel_upload(self):
+        self.client.cancel('upload')
+        self.upload_progress.deleteLater()
+        self.upload_button.setEnabled(True)
+        self.file_label.setText('Upload cancelled')
+    
+    def on_upload_error(self, message):
+        self.close_progress(self.upload_progress, self.cancel_upload)
+        self.upload_button.setEnabled(True)
+        self.show_error(message)
     
     def on_upload_success(self, data):
+        self.close_progress(self.upload_progress, self.cancel_upload)
+        self.upload_button.setEnabled(True)
         self.current_dataset_id = data.get('dataset_id')
         self.file_label.setText(f'Uploaded: {data.get("dataset_name")}')
         QMessageBox.information(self, 'Success', 'File uploaded successfully!')
-        self.load_history()
         self.load_dataset(self.current_dataset_id)
     
     def load_history(self):
-        headers = {'Authorization': f'Token {self.token}'}
-        thread = ApiThread('GET', f'{API_BASE_URL}/history/', headers=headers)
-        self._run_thread(thread, on_success=self.on_history_loaded)
+        self.client.get('history/', channel='history', cache='swr',
+                        on_success=self.on_history_loaded, on_error=self.show_error)
+    
+    def start_events(self):
+        self.event_thread = EventStreamThread(f'{API_BASE_URL}/events/', self.token)
+        self.event_thread.event_received.connect(self.on_server_event)
+        self.event_thread.unsupported.connect(self.stop_events)
+        self.event_thread.unauthorized.connect(self.on_events_unauthorized)
+        self.event_thread.connected.connect(self.on_events_connected)
+        self.event_thread.start()
+    
+    def stop_events(self, wait_ms=2000):
+        thread, self.event_thread = self.event_thread, None
+        if thread is None:
+            return
+        thread.stop()
+        if wait_ms is None:
+            thread.wait()
+        elif not thread.wait(wait_ms):
+            # Still inside a connect attempt; keep the QThread alive until
+            # it returns, since destroying a running QThread aborts the app.
+            self.stopping_threads.add(thread)
+            thread.finished.connect(lambda: self.stopping_threads.discard(thread))
+    
+    def on_events_unauthorized(self):
+        self.stop_events()
+        self.statusBar().showMessage('Live updates stopped - log in again to resume')
+    
+    def on_events_connected(self, reconnected):
+        # Event ids restart with the server, so nothing replays what was
+        # missed while disconnected; fetch the history again instead.
+        if reconnected:
+            self.load_history()
+    
+    def on_server_event(self, event_type, data):
+        if event_type == 'dataset-created':
+            self.history = [data] + [item for item in self.history if item['id'] != data['id']]
+            self.history = self.history[:5]
+        elif event_type == 'dataset-pruned':
+            self.history = [item for item in self.history if item['id'] != data['id']]
+        else:
+            return
+        self.render_history()
+    
+    def on_connectivity_changed(self, offline):
+        if offline:
+            self.statusBar().showMessage('Server unreachable - showing cached data')
+        else:
+            self.statusBar().clearMessage()
+    
+    def closeEvent(self, event):
+        self.stop_events(wait_ms=None)
+        for thread in list(self.stopping_threads):
+            thread.wait()
+        self.client.shutdown()
+        super().closeEvent(event)
     
     def on_history_loaded(self, data):
         self.history = data.get('history', [])
+        self.render_history()
+    
+    def render_history(self):
         self.history_list.clear()
         for item in self.history:
             display_text = f"{item['name']} - {item['equipment_count']} equipment - {item['uploaded_at']}"
@@ -341,11 +409,16 @@ class MainWindow(QMainWindow):
             self.load_dataset(dataset_id)
     
     def load_dataset(self, dataset_id):
-        headers = {'Authorization': f'Token {self.token}'}
-        thread1 = ApiThread('GET', f'{API_BASE_URL}/summary/{dataset_id}/', headers=headers)
-        self._run_thread(thread1, on_success=self.on_summary_loaded)
-        thread2 = ApiThread('GET', f'{API_BASE_URL}/data/{dataset_id}/', headers=headers)
-        self._run_thread(thread2, on_success=self.on_data_loaded)
+        # Only the most recently requested dataset is rendered.
+        self.client.get(f'bundle/{dataset_id}/', channel='dataset',
+                        params={'shape': 'columns', 'limit': TABLE_PAGE_SIZE}, cache='swr',
+                        on_success=self.on_bundle_loaded, on_error=self.show_error)
+    
+    def on_bundle_loaded(self, data):
+        self.current_dataset_id = data.get('dataset_id')
+        self.on_history_loaded(data)
+        self.on_summary_loaded(data)
+        self.on_data_loaded(data)
     
     def on_summary_loaded(self, data):
         self.summary = data
@@ -357,59 +430,126 @@ Average Temperature: {data['summary']['averages']['temperature']}
         """
         self.summary_label.setText(summary_text.strip())
         if self.summary:
+            self.ensure_charts()
             self.chart1.plot_type_distribution(self.summary['summary']['type_distribution'])
             self.chart2.plot_averages(self.summary['summary']['averages'])
     
     def on_data_loaded(self, data):
-        self.equipment_data = data.get('data', [])
-        self.update_table()
-        if self.equipment_data:
-            self.chart3.plot_flowrate_pressure(self.equipment_data)
-    
-    def update_table(self):
-        self.table.setRowCount(len(self.equipment_data))
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels([
-            'Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'
-        ])
+        self.equipment_data = data.get('data', {})
+        total = data.get('total', 0)
+        self.table_group.setTitle(f'Equipment Data ({total} rows)')
+        self.ensure_table_model()
+        # The upload time tells a dataset apart from an earlier one that had
+        # the same id, e.g. before the server database was reset.
+        version = data.get('uploaded_at')
+        self.table_model.load(data.get('dataset_id'), self.equipment_data, total, version)
+        if not total:
+            return
+        # Plot the bundle's sample at once, then every row once it arrives.
+        self.ensure_charts()
+        self.chart3.plot_flowrate_pressure(data.get('series') or self.equipment_data)
+        if total > len(self.equipment_data.get('flowrate', [])):
+            dataset_id = data.get('dataset_id')
+            self.client.get(
+                f'data/{dataset_id}/', channel='series', cache='immutable', version=version,
+                params={'shape': 'columns', 'fields': 'flowrate,pressure'},
+                on_success=lambda series: self.on_series_loaded(dataset_id, series)
+            )
+    
+    def ensure_charts(self):
+        if self.charts is not None:
+            return
+        from charts import ChartWidget
         
-        for row, item in enumerate(self.equipment_data):
-            self.table.setItem(row, 0, QTableWidgetItem(item['equipment_name']))
-            self.table.setItem(row, 1, QTableWidgetItem(item['equipment_type']))
-            self.table.setItem(row, 2, QTableWidgetItem(f"{item['flowrate']:.2f}"))
-            self.table.setItem(row, 3, QTableWidgetItem(f"{item['pressure']:.2f}"))
-            self.table.setItem(row, 4, QTableWidgetItem(f"{item['temperature']:.2f}"))
+        self.charts_layout.removeWidget(self.charts_placeholder)
+        self.charts_placeholder.deleteLater()
+        self.chart1 = ChartWidget()
+        self.chart2 = ChartWidget()
+        self.chart3 = ChartWidget(interactive=True)
+        self.charts = (self.chart1, self.chart2, self.chart3)
+        for chart in self.charts:
+            self.charts_layout.addWidget(chart)
+    
+    def ensure_table_model(self):
+        if self.table_model is not None:
+            return
+        from table_model import EquipmentTableModel
         
-        self.table.resizeColumnsToContents()
+        self.table_model = EquipmentTableModel(self.client, page_size=TABLE_PAGE_SIZE, parent=self)
+        self.table_model.set_filter(self.filter_input.text())
+        self.table.setModel(self.table_model)
+    
+    def on_filter_changed(self, text):
+        if self.table_model is not None:
+            self.table_model.set_filter(text)
+    
+    def on_series_loaded(self, dataset_id, data):
+        if dataset_id == self.current_dataset_id:
+            self.chart3.plot_flowrate_pressure(data.get('data', {}))
     
     def generate_pdf(self):
         if not self.current_dataset_id:
             QMessageBox.warning(self, 'Error', 'No dataset selected')
             return
         
-        headers = {'Authorization': f'Token {self.token}'}
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, 'Save PDF', f'equipment_report_{self.current_dataset_id}.pdf',
+            'PDF Files (*.pdf)'
+        )
+        if not file_path:
+            return
         
-        try:
-            response = requests.get(
-                f'{API_BASE_URL}/pdf/{self.current_dataset_id}/',
-                headers=headers,
-                stream=True
-            )
-            
-            if response.status_code == 200:
-                file_path, _ = QFileDialog.getSaveFileName(
-                    self, 'Save PDF', f'equipment_report_{self.current_dataset_id}.pdf',
-                    'PDF Files (*.pdf)'
-                )
-                
-                if file_path:
-                    with open(file_path, 'wb') as f:
-                        f.write(response.content)
-                    QMessageBox.information(self, 'Success', 'PDF report generated successfully!')
-            else:
-                QMessageBox.warning(self, 'Error', 'Failed to generate PDF')
-        except Exception as e:
-            QMessageBox.critical(self, 'Error', f'Error generating PDF: {str(e)}')
+        self.pdf_button.setEnabled(False)
+        self.pdf_progress = self.start_progress(
+            'Generate PDF Report', 'Downloading PDF report...', self.cancel_pdf
+        )
+        self.client.download(
+            f'pdf/{self.current_dataset_id}/', file_path, channel='pdf', timeout=PDF_TIMEOUT,
+            on_progress=self.on_pdf_progress, on_success=self.on_pdf_saved,
+            on_error=self.on_pdf_error
+        )
+    
+    def on_pdf_progress(self, received, total):
+        self.set_progress(self.pdf_progress, received, total)
+    
+    def cancel_pdf(self):
+        self.client.cancel('pdf')
+        self.pdf_progress.deleteLater()
+        self.pdf_button.setEnabled(True)
+    
+    def finish_pdf(self):
+        self.close_progress(self.pdf_progress, self.cancel_pdf)
+        self.pdf_button.setEnabled(True)
+    
+    def on_pdf_saved(self, file_path):
+        self.finish_pdf()
+        QMessageBox.information(self, 'Success', 'PDF report generated successfully!')
+    
+    def on_pdf_error(self, message):
+        self.finish_pdf()
+        QMessageBox.critical(self, 'Error', f'Error generating PDF: {message}')
+    
+    def set_progress(self, dialog, done, total):
+        # An unknown total leaves the dialog as a busy indicator.
+        if total:
+            dialog.setMaximum(PROGRESS_STEPS)
+            dialog.setValue(max(0, min(done * PROGRESS_STEPS // total, PROGRESS_STEPS)))
+    
+    def start_progress(self, title, label, on_cancel):
+        dialog = QProgressDialog(label, 'Cancel', 0, 0, self)
+        dialog.setWindowTitle(title)
+        dialog.setMinimumDuration(300)
+        # Stay open at 100% while the server finishes; close_progress() closes it.
+        dialog.setAutoReset(False)
+        dialog.setAutoClose(False)
+        dialog.canceled.connect(on_cancel)
+        return dialog
+    
+    def close_progress(self, dialog, on_cancel):
+        # Closing the dialog emits canceled(), which must not cancel anything now.
+        dialog.canceled.disconnect(on_cancel)
+        dialog.close()
+        dialog.deleteLater()
     
     def show_error(self, message):
         QMessageBox.critical(self, 'Error', message)
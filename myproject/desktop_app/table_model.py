@@ -0,0 +1,209 @@
+import numpy as np
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+
+PAGE_SIZE = 5000
+
+COLUMNS = [
+    ('equipment_name', 'Equipment Name'),
+    ('equipment_type', 'Type'),
+    ('flowrate', 'Flowrate'),
+    ('pressure', 'Pressure'),
+    ('temperature', 'Temperature'),
+]
+TEXT_FIELDS = ('equipment_name', 'equipment_type')
+# Joins name and type in the lower-cased search keys; cannot be typed.
+SEARCH_SEPARATOR = '\x1f'
+
+
+class EquipmentTableModel(QAbstractTableModel):
+    """Table model over column arrays of one dataset.
+
+    Rows arrive page by page from ``data/<id>/?shape=columns`` as the view
+    scrolls (canFetchMore/fetchMore). Cells are formatted on demand in
+    ``data()``, and sorting/filtering only rebuild an index array. Each
+    page gets lower-cased search keys once, so filtering is a vectorized
+    substring search; with a filter or sort active a new page is filtered
+    and merged on its own instead of redoing every loaded row.
+    """
+
+    def __init__(self, client, page_size=PAGE_SIZE, parent=None):
+        super().__init__(parent)
+        self.client = client
+        self.page_size = page_size
+        self.dataset_id = None
+        self.version = None
+        self.total = 0
+        self.loaded = 0
+        self._columns = {}
+        self._search_pages = []
+        self._order = None
+        self._sort_keys = None
+        self._sort = None
+        self._filter = ''
+        self._fetching = False
+
+    def load(self, dataset_id, page, total, version=None):
+        self.client.cancel('table')
+        self.beginResetModel()
+        self.dataset_id = dataset_id
+        self.version = version
+        self.total = total
+        self.loaded = 0
+        self._columns = {
+            field: np.empty(total, dtype=object if field in TEXT_FIELDS else np.float64)
+            for field, _ in COLUMNS
+        }
+        self._search_pages = []
+        self._fetching = False
+        self._append_page(page)
+        self._rebuild_order()
+        self.endResetModel()
+
+    def clear(self):
+        self.load(None, {}, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.loaded if self._order is None else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        field = COLUMNS[index.column()][0]
+        if role == Qt.DisplayRole:
+            row = self._source_row(index.row())
+            value = self._columns[field][row]
+            return value if field in TEXT_FIELDS else f'{value:.2f}'
+        if role == Qt.TextAlignmentRole and field not in TEXT_FIELDS:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return COLUMNS[section][1]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._fetching and self.loaded < self.total
+
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        self._fetching = True
+        dataset_id = self.dataset_id
+        self.client.get(
+            f'data/{dataset_id}/', channel='table', cache='immutable', version=self.version,
+            params={'offset': self.loaded, 'limit': self.page_size, 'shape': 'columns'},
+            on_success=lambda data: self._on_page(dataset_id, data),
+            on_error=lambda _message: self._on_page_error(dataset_id)
+        )
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Column -1 restores the order rows were loaded in.
+        self._sort = (COLUMNS[column][0], order) if column >= 0 else None
+        self.layoutAboutToBeChanged.emit()
+        self._rebuild_order()
+        self.layoutChanged.emit()
+
+    def set_filter(self, text):
+        self._filter = text.strip().lower().replace(SEARCH_SEPARATOR, '')
+        self.beginResetModel()
+        self._rebuild_order()
+        self.endResetModel()
+
+    def _on_page(self, dataset_id, data):
+        if dataset_id != self.dataset_id:
+            return
+        self._fetching = False
+        page = data.get('data', {})
+        count = min(len(page.get('flowrate', [])), self.total - self.loaded)
+        if not count:
+            # The server has fewer rows than announced; stop asking, or every
+            # scroll would fetch the same empty (cached) page again.
+            self.total = self.loaded
+            return
+        if self._order is None:
+            self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+            self._append_page(page)
+            self.endInsertRows()
+            return
+        start = self.loaded
+        self._append_page(page)
+        rows = self._matching_rows(start, self.loaded)
+        if not len(rows):
+            return
+        if self._sort is None:
+            first = len(self._order)
+            self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+            self._order = np.concatenate([self._order, rows])
+            self.endInsertRows()
+        else:
+            self.layoutAboutToBeChanged.emit()
+            self._merge_sorted(rows)
+            self.layoutChanged.emit()
+
+    def _on_page_error(self, dataset_id):
+        if dataset_id == self.dataset_id:
+            self._fetching = False
+
+    def _append_page(self, page):
+        count = min(len(page.get('flowrate', [])), self.total - self.loaded)
+        if count <= 0:
+            return
+        for field, _ in COLUMNS:
+            self._columns[field][self.loaded:self.loaded + count] = page[field][:count]
+        names = np.asarray(page['equipment_name'][:count], dtype=str)
+        types = np.asarray(page['equipment_type'][:count], dtype=str)
+        self._search_pages.append(np.char.lower(np.char.add(np.char.add(names, SEARCH_SEPARATOR), types)))
+        self.loaded += count
+
+    def _source_row(self, row):
+        if self._order is None:
+            return row
+        if self._sort is not None and self._sort[1] == Qt.DescendingOrder:
+            # The order is kept ascending so new pages can be merged into it.
+            row = len(self._order) - 1 - row
+        return self._order[row]
+
+    def _matching_rows(self, start, stop):
+        rows = np.arange(start, stop)
+        if not self._filter:
+            return rows
+        keys = self._search_keys(start, stop)
+        return rows[np.char.find(keys, self._filter) >= 0]
+
+    def _search_keys(self, start, stop):
+        # Pages are appended in order, so rows map onto them contiguously.
+        keys, offset = [], 0
+        for page in self._search_pages:
+            if offset + len(page) > start and offset < stop:
+                keys.append(page[max(start - offset, 0):stop - offset])
+            offset += len(page)
+        return np.concatenate(keys) if keys else np.empty(0, dtype=str)
+
+    def _merge_sorted(self, rows):
+        field = self._sort[0]
+        keys = self._columns[field][rows]
+        ranked = np.argsort(keys, kind='stable')
+        rows, keys = rows[ranked], keys[ranked]
+        # side='right' keeps rows with equal keys in load order.
+        positions = np.searchsorted(self._sort_keys, keys, side='right')
+        self._order = np.insert(self._order, positions, rows)
+        self._sort_keys = np.insert(self._sort_keys, positions, keys)
+
+    def _rebuild_order(self):
+        self._sort_keys = None
+        if self._sort is None and not self._filter:
+            self._order = None
+            return
+        order = self._matching_rows(0, self.loaded)
+        if self._sort is not None:
+            keys = self._columns[self._sort[0]][order]
+            ranked = np.argsort(keys, kind='stable')
+            order, self._sort_keys = order[ranked], keys[ranked]
+        self._order = order
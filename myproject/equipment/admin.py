@@ -1,5 +1,10 @@
 from django.contrib import admin
+from django.http import FileResponse, Http404, HttpResponse
+from django.template.response import TemplateResponse
+from django.urls import path
+
 from .models import Dataset, Equipment
+from .profiling import profile_store
 
 
 @admin.register(Dataset)
@@ -14,3 +19,32 @@ class EquipmentAdmin(admin.ModelAdmin):
     list_display = ['equipment_name', 'equipment_type', 'flowrate', 'pressure', 'temperature', 'dataset']
     list_filter = ['equipment_type', 'dataset']
     search_fields = ['equipment_name', 'equipment_type']
+
+
+def profile_list(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiles',
+        'profiles': profile_store.list(),
+        'keep': profile_store.keep,
+    }
+    return TemplateResponse(request, 'admin/equipment/profiles.html', context)
+
+
+def profile_download(request, name, kind):
+    if kind not in ('prof', 'json', 'stats'):
+        raise Http404('Unknown profile format')
+    try:
+        if kind == 'stats':
+            return HttpResponse(profile_store.stats_text(name, request.GET.get('sort', 'cumulative')),
+                                content_type='text/plain; charset=utf-8')
+        suffix = '.prof' if kind == 'prof' else '.json'
+        return FileResponse(open(profile_store.path(name, suffix), 'rb'), as_attachment=True)
+    except (FileNotFoundError, KeyError):
+        raise Http404('Profile not found')
+
+
+profile_urls = [
+    path('', admin.site.admin_view(profile_list), name='profile_list'),
+    path('<str:name>.<str:kind>', admin.site.admin_view(profile_download), name='profile_download'),
+]
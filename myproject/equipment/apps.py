@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class EquipmentConfig(AppConfig):
     name = 'equipment'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import metrics, signals  # noqa: F401
+        connection_created.connect(metrics.install_query_recorder)
@@ -0,0 +1,179 @@
+import asyncio
+import functools
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.authtoken.models import Token
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import aget_columns
+from .events import event_bus, format_sse
+from .models import Dataset
+from .views import (
+    _history_entry, _history_queryset, _page_bounds, _page_data, _page_fields, _series_points,
+    _summary_payload
+)
+
+
+STREAM_CHUNK_ROWS = 2000
+EVENT_HEARTBEAT_SECONDS = 15
+EVENT_RETRY_MS = 3000
+
+
+def _json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder)
+
+
+async def _authenticate(request, allow_query_token=False):
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword != 'Token' or not key:
+        # EventSource cannot set headers, so event streams may pass ?token=.
+        if not allow_query_token or not request.GET.get('token'):
+            return None
+        key = request.GET['token']
+    try:
+        token = await Token.objects.select_related('user').aget(key=key.strip())
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def token_required(view=None, *, allow_query_token=False):
+    """Async counterpart of DRF's TokenAuthentication + IsAuthenticated."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = await _authenticate(request, allow_query_token)
+            if user is None:
+                return _json_response(
+                    {'detail': 'Authentication credentials were not provided.'}, status=401
+                )
+            request.user = user
+            return await view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator(view) if view is not None else decorator
+
+
+async def _history_datasets():
+    # Same per-dataset indexed counts as views._history_datasets.
+    datasets = [dataset async for dataset in _history_queryset()]
+    for dataset in datasets:
+        dataset.equipment_count = await dataset.equipments.acount()
+    return datasets
+
+
+@require_GET
+@token_required
+async def get_history(request):
+    history = [_history_entry(dataset) for dataset in await _history_datasets()]
+    return _json_response({'history': history})
+
+
+@require_GET
+@token_required
+async def get_summary(request, dataset_id):
+    try:
+        dataset = await Dataset.objects.aget(id=dataset_id)
+    except Dataset.DoesNotExist:
+        return _json_response({'error': 'Dataset not found'}, status=404)
+
+    columns = await aget_columns(dataset)
+    if not len(columns):
+        return _json_response({'error': 'No equipment data found'}, status=404)
+
+    return _json_response(_summary_payload(dataset, columns))
+
+
+@require_GET
+@token_required
+async def get_equipment_data(request, dataset_id):
+    try:
+        offset, limit = _page_bounds(request, default_limit=None)
+        fields = _page_fields(request)
+    except ValueError as e:
+        return _json_response({'error': str(e)}, status=400)
+
+    try:
+        dataset = await Dataset.objects.aget(id=dataset_id)
+    except Dataset.DoesNotExist:
+        return _json_response({'error': 'Dataset not found'}, status=404)
+
+    columns = await aget_columns(dataset)
+    stop = len(columns) if limit is None else min(offset + limit, len(columns))
+    if request.GET.get('shape') == 'columns':
+        # One array per field is already compact; only row pages are streamed.
+        return _json_response({
+            'data': _page_data(request, columns, offset, stop, fields),
+            'offset': offset,
+            'total': len(columns)
+        })
+
+    async def stream():
+        yield '{"data": ['
+        for start in range(offset, stop, STREAM_CHUNK_ROWS):
+            chunk = json.dumps(columns.rows(start, min(start + STREAM_CHUNK_ROWS, stop)))[1:-1]
+            yield chunk if start == offset else ', ' + chunk
+            # Let other connections on this event loop make progress.
+            await asyncio.sleep(0)
+        yield f'], "offset": {offset}, "total": {len(columns)}}}'
+
+    return StreamingHttpResponse(stream(), content_type='application/json')
+
+
+@require_GET
+@token_required
+async def get_series(request, dataset_id):
+    try:
+        points = _series_points(request)
+    except ValueError as e:
+        return _json_response({'error': str(e)}, status=400)
+
+    try:
+        dataset = await Dataset.objects.aget(id=dataset_id)
+    except Dataset.DoesNotExist:
+        return _json_response({'error': 'Dataset not found'}, status=404)
+
+    columns = await aget_columns(dataset)
+    return _json_response({'dataset_id': dataset.id, 'series': columns.series(points)})
+
+
+async def event_stream(subscription, heartbeat=EVENT_HEARTBEAT_SECONDS):
+    yield f'retry: {EVENT_RETRY_MS}\n\n'
+    while True:
+        try:
+            event = await asyncio.wait_for(subscription.get(), heartbeat)
+        except asyncio.TimeoutError:
+            # Comment lines keep proxies from closing an idle connection.
+            yield ': keep-alive\n\n'
+            continue
+        yield format_sse(event)
+
+
+@require_GET
+@token_required(allow_query_token=True)
+async def get_events(request):
+    if not isinstance(request, ASGIRequest):
+        # WSGI servers buffer async iterators to the end before sending
+        # anything, so a never-ending stream would pin a worker forever.
+        return _json_response(
+            {'error': 'Live events need an ASGI server (uvicorn myproject.asgi:application)'},
+            status=501
+        )
+
+    async def stream():
+        subscription = event_bus.subscribe()
+        try:
+            async for message in event_stream(subscription):
+                yield message
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,184 @@
+import asyncio
+import threading
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+
+from . import storage
+
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 32
+
+
+class DatasetFrameCache:
+    """Process-local LRU of ``ColumnarDataset`` objects bounded by heap bytes
+    and by entry count.
+
+    Memory-mapped columns do not count toward the byte budget (see
+    ``ColumnarDataset.nbytes``), but each keeps its files open, so the entry
+    cap bounds those. Mapped entries whose files were deleted, possibly by
+    another process, are dropped on lookup so the files can be freed.
+
+    Concurrent misses for the same dataset wait on a per-dataset lock, or
+    in async code share one load task, so the rows are only loaded once.
+    """
+
+    def __init__(self, max_bytes=None, max_entries=None):
+        self._max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._load_locks = {}
+        self._load_tasks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is not None:
+            return self._max_bytes
+        return getattr(settings, 'EQUIPMENT_FRAME_CACHE_BYTES', DEFAULT_MAX_BYTES)
+
+    @property
+    def max_entries(self):
+        if self._max_entries is not None:
+            return self._max_entries
+        return getattr(settings, 'EQUIPMENT_FRAME_CACHE_ENTRIES', DEFAULT_MAX_ENTRIES)
+
+    def peek(self, dataset_id):
+        with self._lock:
+            return self._lookup(dataset_id)
+
+    def get(self, dataset_id, loader):
+        columns = self.peek(dataset_id)
+        if columns is not None:
+            return columns
+
+        with self._lock:
+            load_lock = self._load_locks.setdefault(dataset_id, threading.Lock())
+        with load_lock:
+            with self._lock:
+                columns = self._lookup(dataset_id)
+                if columns is not None:
+                    return columns
+                self.misses += 1
+            try:
+                columns = loader()
+                self.put(dataset_id, columns)
+            finally:
+                with self._lock:
+                    self._load_locks.pop(dataset_id, None)
+        return columns
+
+    async def aget(self, dataset_id, loader):
+        columns = self.peek(dataset_id)
+        if columns is not None:
+            return columns
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            task = self._load_tasks.get(dataset_id)
+            if task is None or task.get_loop() is not loop:
+                self.misses += 1
+                task = loop.create_task(self._aload(dataset_id, loader))
+                self._load_tasks[dataset_id] = task
+            else:
+                self.hits += 1
+        # Shielded so one waiter's client disconnecting doesn't cancel the
+        # load the others are waiting on.
+        return await asyncio.shield(task)
+
+    async def _aload(self, dataset_id, loader):
+        try:
+            columns = await loader()
+            self.put(dataset_id, columns)
+            return columns
+        finally:
+            with self._lock:
+                if self._load_tasks.get(dataset_id) is asyncio.current_task():
+                    del self._load_tasks[dataset_id]
+
+    def put(self, dataset_id, columns):
+        size = columns.nbytes
+        with self._lock:
+            self._discard(dataset_id)
+            if size > self.max_bytes:
+                return
+            self._entries[dataset_id] = columns
+            self._size += size
+            while self._size > self.max_bytes or len(self._entries) > self.max_entries:
+                evicted_id = next(iter(self._entries))
+                self._discard(evicted_id)
+                self.evictions += 1
+
+    def invalidate(self, dataset_id):
+        with self._lock:
+            self._discard(dataset_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'size_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def _lookup(self, dataset_id):
+        # Called with self._lock held.
+        columns = self._entries.get(dataset_id)
+        if columns is None:
+            return None
+        if columns.is_stale():
+            self._discard(dataset_id)
+            return None
+        self._entries.move_to_end(dataset_id)
+        self.hits += 1
+        return columns
+
+    def _discard(self, dataset_id):
+        columns = self._entries.pop(dataset_id, None)
+        if columns is not None:
+            self._size -= columns.nbytes
+
+
+frame_cache = DatasetFrameCache()
+
+
+def get_columns(dataset):
+    def load():
+        columns = storage.load_columns(dataset.id)
+        if columns is None:
+            columns = storage.columns_from_db(dataset)
+        return columns
+
+    return frame_cache.get(dataset.id, load)
+
+
+async def aget_columns(dataset):
+    async def load():
+        # Reading column files and building the arrays both block, so keep
+        # them off the event loop.
+        columns = await sync_to_async(storage.load_columns, thread_sensitive=False)(dataset.id)
+        if columns is None:
+            rows = [row async for row in dataset.equipments.order_by('id').values_list(*storage.ROW_FIELDS)]
+            columns = await sync_to_async(storage.columns_from_rows, thread_sensitive=False)(rows)
+        return columns
+
+    return await frame_cache.aget(dataset.id, load)
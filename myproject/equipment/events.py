@@ -0,0 +1,79 @@
+import asyncio
+import itertools
+import json
+import threading
+
+from rest_framework.utils.encoders import JSONEncoder
+
+
+DEFAULT_QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, bus, maxsize):
+        self._bus = bus
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def offer(self, event):
+        # Runs on the subscriber's loop. A slow consumer loses its oldest
+        # events rather than blocking publishers or growing without bound.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    def close(self):
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    """In-process publish/subscribe hub for dataset change notifications.
+
+    Publishing is thread-safe and never blocks: events are handed to each
+    subscriber's event loop, so idle subscribers cost nothing until
+    something is published.
+    """
+
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def subscribe(self):
+        subscription = Subscription(self, self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    @property
+    def subscriber_count(self):
+        with self._lock:
+            return len(self._subscribers)
+
+    def publish(self, event_type, data):
+        event = {'id': next(self._ids), 'event': event_type, 'data': data}
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The subscriber's loop has shut down without closing.
+                self.unsubscribe(subscription)
+        return event
+
+
+def format_sse(event):
+    data = json.dumps(event['data'], cls=JSONEncoder)
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {data}\n\n"
+
+
+event_bus = EventBus()
@@ -0,0 +1,281 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+
+from equipment.cache import frame_cache
+from equipment.views import MAX_PAGE_SIZE
+
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'api_baseline.json'
+ENDPOINTS = ('upload', 'summary', 'history', 'data', 'pdf')
+CALIBRATION_RUNS = 9
+
+
+def synthetic_csv(path, rows, types, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, types, rows)
+    pd.DataFrame({
+        'Equipment Name': [f'Unit-{index:07d}' for index in range(rows)],
+        'Type': [f'Type-{code:04d}' for code in codes],
+        'Flowrate': rng.uniform(50, 400, rows).round(1),
+        'Pressure': rng.uniform(1, 60, rows).round(1),
+        'Temperature': rng.uniform(20, 300, rows).round(1),
+    }).to_csv(path, index=False)
+
+
+class Command(BaseCommand):
+    help = (
+        'Upload synthetic equipment CSVs into a throwaway test database and '
+        'drive upload, summary, history, data and pdf through the Django test '
+        'client. Reports latency percentiles, peak traced memory and query '
+        'counts per endpoint, and fails when a case regresses past the stored '
+        'JSON baseline. Baseline timings are scaled by a CPU calibration run on '
+        'both machines, so a baseline recorded elsewhere still compares roughly.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+        parser.add_argument('--types', type=int, nargs='+', default=[5, 1000],
+                            help='Distinct equipment types per dataset.')
+        parser.add_argument('--repeat', type=int, default=10,
+                            help='Timed requests per read endpoint.')
+        parser.add_argument('--upload-repeat', type=int, default=2)
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the dataset frame cache before every read.')
+        parser.add_argument('--columnar', action='store_true',
+                            help='Benchmark with EQUIPMENT_COLUMNAR_STORAGE enabled.')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--output', help='Also write this run\'s results to this JSON file.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed p50 latency (after calibration scaling) and '
+                                 'peak memory growth, as a fraction.')
+        parser.add_argument('--min-delta-ms', type=float, default=2.0,
+                            help='Ignore p50 changes smaller than this.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0)
+        databases = runner.setup_databases()
+        try:
+            with tempfile.TemporaryDirectory() as workdir, override_settings(
+                DEBUG=False, MEDIA_ROOT=workdir, EQUIPMENT_COLUMNAR_STORAGE=options['columnar']
+            ):
+                results = {
+                    'environment': _environment(),
+                    'calibration_ms': _calibrate(),
+                    'cases': self._run(workdir, options),
+                }
+        finally:
+            frame_cache.clear()
+            runner.teardown_databases(databases)
+            teardown_test_environment()
+
+        if options['output']:
+            _write_json(options['output'], results)
+        if options['update_baseline']:
+            _write_json(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+
+        if not os.path.exists(options['baseline']):
+            self.stdout.write('No baseline yet; run with --update-baseline to record one.')
+            return
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+        scale = results['calibration_ms'] / baseline['calibration_ms']
+        self.stdout.write(
+            f'Calibration {results["calibration_ms"]:.1f} ms here, '
+            f'{baseline["calibration_ms"]:.1f} ms for the baseline; baseline timings x{scale:.2f}.'
+        )
+        changed = sorted(key for key, value in results['environment'].items()
+                         if baseline['environment'].get(key) != value)
+        if changed:
+            self.stdout.write(self.style.WARNING(
+                'Environment differs from the baseline (' + ', '.join(
+                    f'{key}: {baseline["environment"].get(key)} -> {results["environment"][key]}'
+                    for key in changed
+                ) + '); timing comparisons are approximate.'
+            ))
+        regressions = _compare(results['cases'], baseline['cases'], scale,
+                               options['tolerance'], options['min_delta_ms'])
+        if regressions:
+            raise CommandError('Regressions against the baseline:\n  ' + '\n  '.join(regressions))
+        self.stdout.write(self.style.SUCCESS(
+            f'No regressions against {options["baseline"]} '
+            f'({len(set(results["cases"]) & set(baseline["cases"]))} cases compared).'
+        ))
+
+    def _run(self, workdir, options):
+        user = User.objects.create_user('bench', password='bench')
+        client = Client(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+        self.stdout.write(f'{"case":<34} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+                          f'{"peak MB":>8} {"queries":>8}')
+        results = {}
+        for rows in options['rows']:
+            for types in options['types']:
+                path = os.path.join(workdir, f'bench_{rows}_{types}.csv')
+                synthetic_csv(path, rows, types)
+                dataset_id = None
+
+                def upload():
+                    nonlocal dataset_id
+                    with open(path, 'rb') as f:
+                        response = client.post('/api/equipment/upload/', {'file': f})
+                    dataset_id = response.json().get('dataset_id')
+                    return response
+
+                requests = {
+                    'upload': (upload, options['upload_repeat'], False),
+                    'summary': (lambda: client.get(f'/api/equipment/summary/{dataset_id}/'),
+                                options['repeat'], options['cold']),
+                    'history': (lambda: client.get('/api/equipment/history/'), options['repeat'], False),
+                    # One maximum-size page, as paging clients read it; the whole
+                    # of a 1M-row dataset as row dicts does not fit in memory.
+                    'data': (lambda: client.get(f'/api/equipment/data/{dataset_id}/',
+                                                {'limit': MAX_PAGE_SIZE}),
+                             options['repeat'], options['cold']),
+                    'pdf': (lambda: client.get(f'/api/equipment/pdf/{dataset_id}/'),
+                            options['repeat'], options['cold']),
+                }
+                for endpoint in ENDPOINTS:
+                    send, repeat, cold = requests[endpoint]
+                    case = f'rows={rows} types={types} {endpoint}'
+                    results[case] = _measure(send, repeat, cold)
+                    self._report(case, results[case])
+                os.remove(path)
+        return results
+
+    def _report(self, case, result):
+        self.stdout.write(
+            f'{case:<34} {result["p50_ms"]:>9.1f} {result["p95_ms"]:>9.1f} {result["p99_ms"]:>9.1f} '
+            f'{result["peak_mb"]:>8.1f} {result["queries"]:>8}'
+        )
+
+
+def _measure(send, repeat, cold):
+    # One traced request for memory and queries, then untraced timed runs,
+    # since tracemalloc itself slows every allocation down.
+    if cold:
+        frame_cache.clear()
+    queries = _QueryCounter()
+    tracemalloc.start()
+    try:
+        with connection.execute_wrapper(queries):
+            response = send()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if response.status_code >= 400:
+        raise CommandError(f'{response.status_code} from {response.request["PATH_INFO"]}: '
+                           f'{response.content[:200]!r}')
+
+    latencies = []
+    for _ in range(repeat):
+        if cold:
+            frame_cache.clear()
+        started = time.perf_counter()
+        send()
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        'p50_ms': round(_percentile(latencies, 50), 2),
+        'p95_ms': round(_percentile(latencies, 95), 2),
+        'p99_ms': round(_percentile(latencies, 99), 2),
+        'peak_mb': round(peak / (1024 * 1024), 2),
+        'queries': queries.count,
+        'bytes': len(response.content),
+    }
+
+
+def _environment():
+    return {
+        'python': platform.python_version(),
+        'system': platform.system(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'django': django.get_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'database': connection.vendor,
+    }
+
+
+def _calibrate():
+    """Fastest time of a fixed CPU-bound workload, in milliseconds.
+
+    It mixes the kinds of work the endpoints do (building dicts, JSON,
+    numpy) so its ratio between two machines approximates theirs. The
+    fastest run is the least disturbed by other load.
+    """
+    samples = []
+    for _ in range(CALIBRATION_RUNS):
+        started = time.perf_counter()
+        rows = [{'id': index, 'name': f'Unit-{index}', 'value': index * 0.5}
+                for index in range(50000)]
+        json.loads(json.dumps(rows))
+        np.sort(np.random.default_rng(0).random(500000))
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(min(samples), 2)
+
+
+class _QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def _compare(results, baseline, scale, tolerance, min_delta_ms):
+    # Latency is compared after scaling by the calibration ratio; memory and
+    # query counts don't depend on CPU speed and are compared as recorded.
+    regressions = []
+    for case, result in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        expected_ms = previous['p50_ms'] * scale
+        p50_limit = max(expected_ms * (1 + tolerance), expected_ms + min_delta_ms)
+        if result['p50_ms'] > p50_limit:
+            regressions.append(f'{case}: p50 {result["p50_ms"]:.1f} ms > {p50_limit:.1f} ms')
+        peak_limit = previous['peak_mb'] * (1 + tolerance) + 0.5
+        if result['peak_mb'] > peak_limit:
+            regressions.append(f'{case}: peak {result["peak_mb"]:.1f} MB > {peak_limit:.1f} MB')
+        if result['queries'] > previous['queries']:
+            regressions.append(f'{case}: {result["queries"]} queries > {previous["queries"]}')
+    return regressions
+
+
+def _write_json(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+        f.write('\n')
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from equipment.async_views import event_stream
+from equipment.events import EventBus
+
+
+class Command(BaseCommand):
+    help = (
+        'Attach N stand-in SSE clients to an event bus, measure the CPU time '
+        'they burn while idle, then publish one event from another thread and '
+        'measure how long it takes to reach every client.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, default=500)
+        parser.add_argument('--idle', type=float, default=10.0,
+                            help='Seconds to leave the subscribers idle.')
+        parser.add_argument('--heartbeat', type=float, default=15.0,
+                            help='Keep-alive interval used by the stand-in streams.')
+        parser.add_argument('--max-idle-cpu', type=float, default=0.02,
+                            help='Fail if idle CPU time exceeds this fraction of wall time.')
+
+    def handle(self, *args, **options):
+        result = asyncio.run(_measure(options['subscribers'], options['idle'], options['heartbeat']))
+        idle_fraction = result['idle_cpu'] / options['idle']
+
+        self.stdout.write(f'subscribers:         {options["subscribers"]}')
+        self.stdout.write(f'idle CPU:            {result["idle_cpu"] * 1000:.1f} ms over '
+                          f'{options["idle"]:.1f} s ({idle_fraction:.3%})')
+        self.stdout.write(f'fan-out to all:      {result["fanout"] * 1000:.1f} ms')
+        self.stdout.write(f'events delivered:    {result["delivered"]}')
+
+        if result['delivered'] != options['subscribers']:
+            raise CommandError('Not every subscriber received the published event.')
+        if idle_fraction > options['max_idle_cpu']:
+            raise CommandError(f'Idle subscribers used {idle_fraction:.3%} CPU, '
+                               f'above the {options["max_idle_cpu"]:.3%} limit.')
+
+
+async def _measure(count, idle, heartbeat):
+    bus = EventBus()
+    received = asyncio.Event()
+    delivered = 0
+
+    async def client():
+        nonlocal delivered
+        subscription = bus.subscribe()
+        stream = event_stream(subscription, heartbeat=heartbeat)
+        try:
+            async for message in stream:
+                if message.startswith('id:'):
+                    delivered += 1
+                    if delivered == count:
+                        received.set()
+                    return
+        finally:
+            await stream.aclose()
+            subscription.close()
+
+    clients = [asyncio.create_task(client()) for _ in range(count)]
+    while bus.subscriber_count < count:
+        await asyncio.sleep(0.01)
+
+    cpu_started = time.process_time()
+    await asyncio.sleep(idle)
+    idle_cpu = time.process_time() - cpu_started
+
+    published = time.perf_counter()
+    publisher = threading.Thread(target=bus.publish, args=('dataset-created', {'id': 0}))
+    publisher.start()
+    await asyncio.wait_for(received.wait(), 30)
+    fanout = time.perf_counter() - published
+    publisher.join()
+
+    await asyncio.gather(*clients)
+    return {'idle_cpu': idle_cpu, 'fanout': fanout, 'delivered': delivered}
@@ -0,0 +1,93 @@
+import os
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from rest_framework.authtoken.models import Token
+
+from equipment.cache import frame_cache
+from equipment.management.commands.bench_api import synthetic_csv
+from equipment.metrics import registry
+
+
+METRICS_MIDDLEWARE = 'equipment.middleware.MetricsMiddleware'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time a cheap endpoint (summary/ by default) through the Django test '
+        'client with and without MetricsMiddleware, in alternating rounds, '
+        'and fail if metrics add more than --max-overhead per request.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per round.')
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--endpoint', default='summary',
+                            help='Dataset endpoint under /api/equipment/<endpoint>/<id>/.')
+        parser.add_argument('--max-overhead', type=float, default=0.10,
+                            help='Allowed median slowdown, as a fraction.')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        runner = DiscoverRunner(verbosity=0)
+        databases = runner.setup_databases()
+        try:
+            with tempfile.TemporaryDirectory() as workdir, override_settings(
+                DEBUG=False, MEDIA_ROOT=workdir
+            ):
+                with_metrics, without = self._run(workdir, options)
+        finally:
+            frame_cache.clear()
+            registry.reset()
+            runner.teardown_databases(databases)
+            teardown_test_environment()
+
+        base = statistics.median(without)
+        cost = statistics.median(with_metrics)
+        overhead = cost / base - 1
+        self.stdout.write(f'without metrics: {base:.1f} us/request (median of {options["rounds"]} rounds)')
+        self.stdout.write(f'with metrics:    {cost:.1f} us/request')
+        self.stdout.write(f'overhead:        {cost - base:+.1f} us ({overhead:+.1%})')
+        if overhead > options['max_overhead']:
+            raise CommandError(f'Metrics overhead {overhead:.1%} exceeds {options["max_overhead"]:.1%}')
+
+    def _run(self, workdir, options):
+        user = User.objects.create_user('bench', password='bench')
+        auth = f'Token {Token.objects.create(user=user).key}'
+        path = os.path.join(workdir, 'bench.csv')
+        synthetic_csv(path, options['rows'], 5)
+        with open(path, 'rb') as f:
+            response = Client(HTTP_AUTHORIZATION=auth).post('/api/equipment/upload/', {'file': f})
+        if response.status_code != 201:
+            raise CommandError(f'Upload failed with {response.status_code}: {response.content[:200]!r}')
+        url = f'/api/equipment/{options["endpoint"]}/{response.json()["dataset_id"]}/'
+
+        middleware = list(settings.MIDDLEWARE)
+        if METRICS_MIDDLEWARE not in middleware:
+            middleware.insert(0, METRICS_MIDDLEWARE)
+        stacks = {
+            True: middleware,
+            False: [name for name in middleware if name != METRICS_MIDDLEWARE],
+        }
+        timings = {True: [], False: []}
+        # Alternate so drift in machine load hits both sides alike.
+        for _ in range(options['rounds']):
+            for enabled, stack in stacks.items():
+                with override_settings(MIDDLEWARE=stack):
+                    client = Client(HTTP_AUTHORIZATION=auth)
+                    client.get(url)
+                    started = time.perf_counter()
+                    for _ in range(options['requests']):
+                        client.get(url)
+                    elapsed = time.perf_counter() - started
+                timings[enabled].append(elapsed / options['requests'] * 1e6)
+        return timings[True], timings[False]
@@ -0,0 +1,84 @@
+import gzip
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from equipment import renderers, storage
+from equipment.middleware import BROTLI_QUALITY
+
+
+EQUIPMENT_TYPES = ['Reactor', 'Distillation Column', 'Heat Exchanger', 'Centrifugal Pump', 'Compressor']
+
+
+def synthetic_columns(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    types = [EQUIPMENT_TYPES[code] for code in rng.integers(0, len(EQUIPMENT_TYPES), rows)]
+    return storage.build_columns(
+        np.arange(1, rows + 1),
+        [f'{equipment_type.split()[0]}-{index:07d}' for index, equipment_type in enumerate(types)],
+        types,
+        rng.uniform(50, 400, rows).round(1),
+        rng.uniform(1, 60, rows).round(1),
+        rng.uniform(20, 300, rows).round(1),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure serialize time and bytes on the wire for data/ payloads of '
+        'synthetic datasets, per renderer, response shape and content encoding.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 1000000])
+        parser.add_argument('--repeat', type=int, default=3,
+                            help='Report the best of this many runs.')
+
+    def handle(self, *args, **options):
+        candidates = [('drf-json', JSONRenderer())]
+        if renderers.orjson is not None:
+            candidates.append(('orjson', renderers.FastJSONRenderer()))
+        else:
+            self.stderr.write('orjson not installed; skipping FastJSONRenderer.')
+        if renderers.msgpack is not None:
+            candidates.append(('msgpack', renderers.MessagePackRenderer()))
+        else:
+            self.stderr.write('msgpack not installed; skipping MessagePackRenderer.')
+
+        encoders = [('identity', None), ('gzip', lambda body: gzip.compress(body, 6))]
+        try:
+            import brotli
+            encoders.append(('br', lambda body: brotli.compress(body, quality=BROTLI_QUALITY)))
+        except ImportError:
+            self.stderr.write('brotli not installed; skipping br encoding.')
+
+        self.stdout.write(f'{"rows":>8} {"shape":>8} {"renderer":>9} {"encoding":>9} '
+                          f'{"render ms":>10} {"encode ms":>10} {"bytes":>12}')
+        for rows in options['rows']:
+            columns = synthetic_columns(rows)
+            payloads = {
+                'rows': lambda: {'data': columns.rows(), 'offset': 0, 'total': rows},
+                'columns': lambda: {'data': columns.column_slice(), 'offset': 0, 'total': rows},
+            }
+            for shape, build in payloads.items():
+                for renderer_name, renderer in candidates:
+                    render_ms, body = _best_of(options['repeat'], lambda: renderer.render(build()))
+                    for encoding, encode in encoders:
+                        encode_ms, wire = (0.0, body) if encode is None else _best_of(
+                            options['repeat'], lambda: encode(body)
+                        )
+                        self.stdout.write(
+                            f'{rows:>8} {shape:>8} {renderer_name:>9} {encoding:>9} '
+                            f'{render_ms:>10.1f} {encode_ms:>10.1f} {len(wire):>12}'
+                        )
+
+
+def _best_of(repeat, func):
+    best, result = float('inf'), None
+    for _ in range(max(repeat, 1)):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best, result
@@ -0,0 +1,144 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Hold N concurrent keep-alive connections against a running server and '
+        'report throughput, latency percentiles and errors for each N. Run it '
+        'once against a single WSGI worker and once against a single ASGI worker '
+        'to compare how many connections each sustains.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000',
+                            help='Server base URL.')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help='Request path; repeat to rotate through several. '
+                                 'Defaults to /api/equipment/async/history/.')
+        parser.add_argument('--token', required=True, help='API token to send.')
+        parser.add_argument('--concurrency', type=int, nargs='+',
+                            default=[10, 50, 100, 200, 500])
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='Seconds to hold each concurrency level.')
+        parser.add_argument('--read-delay-ms', type=float, default=0.0,
+                            help='Pause between body reads to mimic slow clients.')
+        parser.add_argument('--max-p95-ms', type=float, default=1000.0,
+                            help='A level is sustained if p95 stays under this.')
+        parser.add_argument('--max-error-rate', type=float, default=0.01)
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http':
+            raise CommandError('Only plain http:// servers are supported.')
+        paths = options['paths'] or ['/api/equipment/async/history/']
+
+        sustained = 0
+        self.stdout.write(f'{"conns":>6} {"req/s":>9} {"p50 ms":>9} {"p95 ms":>9} '
+                          f'{"p99 ms":>9} {"errors":>7}')
+        for concurrency in options['concurrency']:
+            result = asyncio.run(_run_level(
+                url.hostname, url.port or 80, paths, options['token'], concurrency,
+                options['duration'], options['read_delay_ms'] / 1000
+            ))
+            latencies = sorted(result['latencies'])
+            total = len(latencies) + result['errors']
+            p50, p95, p99 = (_percentile(latencies, q) for q in (50, 95, 99))
+            self.stdout.write(
+                f'{concurrency:>6} {len(latencies) / options["duration"]:>9.1f} '
+                f'{p50:>9.1f} {p95:>9.1f} {p99:>9.1f} {result["errors"]:>7}'
+            )
+            error_rate = result['errors'] / total if total else 1.0
+            if error_rate <= options['max_error_rate'] and latencies and p95 <= options['max_p95_ms']:
+                sustained = concurrency
+
+        self.stdout.write(self.style.SUCCESS(f'Sustained concurrency: {sustained}'))
+
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+async def _run_level(host, port, paths, token, concurrency, duration, read_delay):
+    result = {'latencies': [], 'errors': 0}
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        _client(host, port, paths, token, deadline, read_delay, result, offset)
+        for offset in range(concurrency)
+    ))
+    return result
+
+
+async def _client(host, port, paths, token, deadline, read_delay, result, offset):
+    reader = writer = None
+    sent = offset
+    while time.perf_counter() < deadline:
+        path = paths[sent % len(paths)]
+        sent += 1
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            started = time.perf_counter()
+            writer.write((
+                f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+                f'Authorization: Token {token}\r\nConnection: keep-alive\r\n\r\n'
+            ).encode('latin-1'))
+            await writer.drain()
+            status, keep_alive = await _read_response(reader, read_delay)
+            if status >= 400:
+                result['errors'] += 1
+            else:
+                result['latencies'].append((time.perf_counter() - started) * 1000)
+            if not keep_alive:
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            result['errors'] += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            await asyncio.sleep(0.05)
+    if writer is not None:
+        writer.close()
+
+
+async def _read_response(reader, read_delay):
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip().lower()
+
+    if 'content-length' in headers:
+        remaining = int(headers['content-length'])
+        while remaining:
+            chunk = await reader.read(min(remaining, 65536))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+            if read_delay:
+                await asyncio.sleep(read_delay)
+    elif headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if not size:
+                break
+            if read_delay:
+                await asyncio.sleep(read_delay)
+    else:
+        await reader.read()
+        return status, False
+
+    return status, headers.get('connection') != 'close'
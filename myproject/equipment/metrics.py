@@ -0,0 +1,229 @@
+import threading
+import weakref
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1024, 10 * 1024, 100 * 1024, 1024 ** 2, 10 * 1024 ** 2, 100 * 1024 ** 2)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 500, 1000, 5000)
+
+HISTOGRAMS = {
+    'equipment_http_request_duration_seconds': (
+        'Time from request to response, by view.', ('view', 'method'), LATENCY_BUCKETS),
+    'equipment_http_response_size_bytes': (
+        'Response body size as sent, by view. Streaming responses are not included.',
+        ('view',), SIZE_BUCKETS),
+    'equipment_db_queries_per_request': (
+        'SQL queries run while handling one request, by view.', ('view',), QUERY_BUCKETS),
+    'equipment_phase_duration_seconds': (
+        'Time spent in named phases of a view (parse, insert, load, aggregate, render).',
+        ('view', 'phase'), LATENCY_BUCKETS),
+}
+COUNTERS = {
+    'equipment_http_requests_total': (
+        'Requests handled, by view, method and status code.', ('view', 'method', 'status')),
+    'equipment_db_query_duration_seconds_total': (
+        'Time spent waiting on SQL, by view.', ('view',)),
+}
+
+
+class RequestMetrics:
+    """What one request has accumulated so far; lives in a context variable."""
+
+    __slots__ = ('started', 'queries', 'query_seconds', 'phases')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.phases = []
+
+
+_current = ContextVar('equipment_request_metrics', default=None)
+
+
+class _Shard:
+    # Only the owning thread writes to a shard, so updates need no lock.
+    def __init__(self, thread=None):
+        self.thread = weakref.ref(thread) if thread is not None else None
+        self.counters = {}
+        self.histograms = {}
+
+    def is_alive(self):
+        thread = self.thread() if self.thread is not None else None
+        return thread is not None and thread.is_alive()
+
+    def merge_into(self, counters, histograms):
+        # dict.copy() is atomic, so a thread writing meanwhile is safe.
+        for key, value in self.counters.copy().items():
+            counters[key] = counters.get(key, 0) + value
+        for key, values in self.histograms.copy().items():
+            merged = histograms.setdefault(key, [0] * len(values))
+            for index, value in enumerate(list(values)):
+                merged[index] += value
+
+
+class MetricsRegistry:
+    """Counters and histograms kept in one shard per thread.
+
+    Recording touches only the calling thread's shard; ``collect()`` sums
+    the shards when /metrics is scraped. Shards of threads that have
+    exited are folded into one retired shard, so servers that start a
+    thread per connection don't grow the list without bound.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = []
+        self._retired = _Shard()
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._retire_dead()
+                self._shards.append(shard)
+        return shard
+
+    def _retire_dead(self):
+        live = []
+        for shard in self._shards:
+            if shard.is_alive():
+                live.append(shard)
+            else:
+                shard.merge_into(self._retired.counters, self._retired.histograms)
+        self._shards = live
+
+    def inc(self, name, labels, amount=1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        buckets = HISTOGRAMS[name][2]
+        histogram = histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (last one is +Inf), then the running sum.
+            histogram = histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+        histogram[bisect_left(buckets, value)] += 1
+        histogram[-1] += value
+
+    def collect(self):
+        counters, histograms = {}, {}
+        with self._lock:
+            self._retire_dead()
+            self._retired.merge_into(counters, histograms)
+            shards = list(self._shards)
+        for shard in shards:
+            shard.merge_into(counters, histograms)
+        return counters, histograms
+
+    @property
+    def shard_count(self):
+        with self._lock:
+            return len(self._shards)
+
+    def reset(self):
+        with self._lock:
+            for shard in [self._retired] + self._shards:
+                shard.counters.clear()
+                shard.histograms.clear()
+
+    def render(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name, (description, label_names) in COUNTERS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} counter')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(label_names, labels)} {_number(value)}')
+        for name, (description, label_names, buckets) in HISTOGRAMS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), values in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + ('+Inf',), values[:-1]):
+                    cumulative += count
+                    bucket_labels = _labels(label_names + ('le',), labels + (_number(bound),))
+                    lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{name}_sum{_labels(label_names, labels)} {_number(values[-1])}')
+                lines.append(f'{name}_count{_labels(label_names, labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, str):
+        return value
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+
+
+def start_request():
+    state = RequestMetrics()
+    return state, _current.set(state)
+
+
+def finish_request(state, token, view, method, status, size):
+    _current.reset(token)
+    registry.observe('equipment_http_request_duration_seconds', (view, method),
+                     perf_counter() - state.started)
+    registry.inc('equipment_http_requests_total', (view, method, str(status)))
+    registry.observe('equipment_db_queries_per_request', (view,), state.queries)
+    if state.query_seconds:
+        registry.inc('equipment_db_query_duration_seconds_total', (view,), state.query_seconds)
+    if size is not None:
+        registry.observe('equipment_http_response_size_bytes', (view,), size)
+    for name, seconds in state.phases:
+        registry.observe('equipment_phase_duration_seconds', (view, name), seconds)
+
+
+@contextmanager
+def phase(name):
+    """Time a named step of the current request; a no-op outside requests."""
+    state = _current.get()
+    if state is None:
+        yield
+        return
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        state.phases.append((name, perf_counter() - started))
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper counting queries against the current request."""
+    state = _current.get()
+    if state is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        state.queries += 1
+        state.query_seconds += perf_counter() - started
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
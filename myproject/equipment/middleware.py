@@ -0,0 +1,153 @@
+import re
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import has_vary_header, patch_vary_headers
+
+from . import metrics, profiling
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+re_accepts_br = re.compile(r'\bbr\b')
+
+DEFAULT_MIN_LENGTH = 1024
+BROTLI_QUALITY = 4
+# Formats that are compressed already; another pass only costs CPU.
+COMPRESSED_CONTENT_TYPES = (
+    'application/pdf', 'application/gzip', 'application/x-gzip', 'application/zip',
+    'image/', 'audio/', 'video/',
+)
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Compress responses above EQUIPMENT_COMPRESS_MIN_BYTES.
+
+    Brotli is preferred when the client accepts it and the ``brotli`` package
+    is installed; otherwise this behaves like Django's GZipMiddleware.
+    Responses that vary on Cookie (session pages, forms with a CSRF token)
+    may hold secrets, so they always take the gzip path, whose random
+    padding is Django's BREACH mitigation; brotli has no header to pad.
+    Event streams and already-compressed formats such as PDF are left as is.
+    """
+
+    def process_response(self, request, response):
+        content_type = response.get('Content-Type', '')
+        # Event streams must reach the client unbuffered, and compressed
+        # formats don't shrink.
+        if content_type.startswith(('text/event-stream',) + COMPRESSED_CONTENT_TYPES):
+            return response
+        min_length = getattr(settings, 'EQUIPMENT_COMPRESS_MIN_BYTES', DEFAULT_MIN_LENGTH)
+        if not response.streaming and len(response.content) < min_length:
+            return response
+        if (
+            brotli is None
+            or response.streaming
+            or response.has_header('Content-Encoding')
+            or has_vary_header(response, 'Cookie')
+            or not re_accepts_br.search(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response.headers['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = 'br'
+        return response
+
+
+class MetricsMiddleware:
+    """Record latency, status, SQL and response size for every request.
+
+    Put it first in MIDDLEWARE so the timing covers the other middleware and
+    the size is what goes on the wire. Requests are labelled by URL name;
+    the numbers are served by the /metrics view.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state, token = metrics.start_request()
+        response = self.get_response(request)
+        self._finish(request, response, state, token)
+        return response
+
+    async def __acall__(self, request):
+        state, token = metrics.start_request()
+        response = await self.get_response(request)
+        self._finish(request, response, state, token)
+        return response
+
+    def _finish(self, request, response, state, token):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match is not None else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        metrics.finish_request(state, token, view, request.method, response.status_code, size)
+
+
+class ProfilingMiddleware:
+    """Profile single requests from staff on demand.
+
+    Only installed when EQUIPMENT_PROFILING is on; otherwise Django drops it
+    at start-up. A staff request with ``X-Profile: 1`` or ``?profile=1`` runs
+    under cProfile with its SQL logged, is stored by ``profiling.profile_store``
+    and gets an ``X-Profile-Id`` header naming the stored profile. Async
+    views are only partly covered; see ``profiling.profile_call``.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'EQUIPMENT_PROFILING', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not profiling.is_requested(request):
+            return self.get_response(request)
+        return self._profile(request, lambda: self.get_response(request))
+
+    async def __acall__(self, request):
+        if not profiling.is_requested(request):
+            return await self.get_response(request)
+        # cProfile only sees its own thread, so run the rest of the chain
+        # from a worker thread; thread-sensitive sync views and ORM calls
+        # then execute in that same thread. Async views still run on the
+        # event loop and are missing from the profile.
+        return await sync_to_async(self._profile)(
+            request, lambda: async_to_sync(self.get_response)(request)
+        )
+
+    def _profile(self, request, call):
+        if not profiling.is_staff(request):
+            return call()
+        response, name = profiling.profile_call(request, call)
+        response.headers['X-Profile-Id'] = name
+        return response
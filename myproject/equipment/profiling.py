@@ -0,0 +1,203 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from pathlib import Path
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connection
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+DEFAULT_KEEP = 50
+# Enough to see an N+1 pattern without a 1M-row upload writing every INSERT.
+MAX_LOGGED_QUERIES = 2000
+NAME_RE = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9]{6}-[0-9a-f]{6}$')
+
+
+def profiles_dir():
+    return Path(settings.MEDIA_ROOT) / 'profiles'
+
+
+def is_requested(request):
+    """Whether the client asked for a profile; no database access."""
+    return request.headers.get(PROFILE_HEADER) == '1' or request.GET.get(PROFILE_PARAM) == '1'
+
+
+def is_staff(request):
+    # Token clients are only authenticated inside the DRF view, so check the
+    # token here as well as the session user.
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+class QueryLog:
+    """Execute wrapper keeping SQL text, parameters and timing.
+
+    Parameters equal to one of ``secrets`` are logged as ``'<redacted>'``.
+    """
+
+    def __init__(self, limit=MAX_LOGGED_QUERIES, secrets=()):
+        self.limit = limit
+        self.secrets = {secret for secret in secrets if secret}
+        self.entries = []
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if len(self.entries) < self.limit:
+                self.entries.append({
+                    'sql': sql,
+                    'params': None if many else self._loggable(params),
+                    'many': many,
+                    'ms': round(elapsed * 1000, 3),
+                })
+
+    def _loggable(self, params):
+        if params is None:
+            return None
+        return [
+            '<redacted>' if isinstance(value, str) and value in self.secrets
+            else value if isinstance(value, (int, float, str, bool, type(None)))
+            else repr(value)
+            for value in params
+        ]
+
+
+class ProfileStore:
+    """Profiles under MEDIA_ROOT/profiles, keeping the newest ``keep``.
+
+    Each profile is ``<name>.prof`` (pstats) plus ``<name>.json`` holding
+    the request details and SQL log. Names start with the UTC time down to
+    the microsecond, so sorting them sorts by age.
+    """
+
+    def __init__(self, keep=None):
+        self._keep = keep
+        self._lock = threading.Lock()
+
+    @property
+    def keep(self):
+        if self._keep is not None:
+            return self._keep
+        return getattr(settings, 'EQUIPMENT_PROFILE_KEEP', DEFAULT_KEEP)
+
+    def save(self, profiler, meta, queries):
+        directory = profiles_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        created = meta['created']
+        name = (f'{time.strftime("%Y%m%d-%H%M%S", time.gmtime(created))}-'
+                f'{int(created * 1e6) % 1000000:06d}-{uuid.uuid4().hex[:6]}')
+        profiler.dump_stats(directory / f'{name}.prof')
+        # The JSON goes last so listings never show a half-written profile.
+        staging = directory / f'{name}.json.tmp'
+        with open(staging, 'w') as f:
+            json.dump({**meta, 'name': name, 'sql': queries}, f)
+        os.replace(staging, directory / f'{name}.json')
+        self._rotate(directory)
+        return name
+
+    def _rotate(self, directory):
+        with self._lock:
+            names = sorted(path.stem for path in directory.glob('*.json'))
+            for name in names[:max(len(names) - self.keep, 0)]:
+                for suffix in ('.json', '.prof'):
+                    try:
+                        os.remove(directory / f'{name}{suffix}')
+                    except FileNotFoundError:
+                        pass
+
+    def list(self):
+        profiles = []
+        for path in sorted(profiles_dir().glob('*.json'), reverse=True):
+            try:
+                with open(path) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            meta.pop('sql', None)
+            profiles.append(meta)
+        return profiles
+
+    def path(self, name, suffix):
+        if not NAME_RE.match(name) or suffix not in ('.json', '.prof'):
+            raise FileNotFoundError(name)
+        path = profiles_dir() / f'{name}{suffix}'
+        if not path.exists():
+            raise FileNotFoundError(name)
+        return path
+
+    def stats_text(self, name, sort='cumulative', limit=60):
+        output = io.StringIO()
+        stats = pstats.Stats(str(self.path(name, '.prof')), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+profile_store = ProfileStore()
+
+
+def profile_call(request, call):
+    """Run ``call()`` under cProfile with SQL logging and store the result.
+
+    Returns ``(response, name)``; ``name`` identifies the stored profile.
+    cProfile only sees the calling thread, so for async views (the
+    ``async/`` and ``events/`` endpoints) it records the middleware and
+    sync work but not the view's coroutine, which runs on an event loop
+    thread; those profiles are stored with ``async_view`` set.
+    """
+    profiler = cProfile.Profile()
+    # The caller's own token shows up in DRF's authentication query.
+    queries = QueryLog(secrets=(
+        request.headers.get('Authorization', '').partition(' ')[2],
+        request.GET.get('token'),
+    ))
+    created = time.time()
+    started = perf_counter()
+    with connection.execute_wrapper(queries):
+        profiler.enable()
+        try:
+            response = call()
+        finally:
+            profiler.disable()
+    elapsed = perf_counter() - started
+    match = request.resolver_match
+    user = getattr(request, 'user', None)
+    meta = {
+        'created': created,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': (match.url_name or match.view_name) if match is not None else 'unmatched',
+        'async_view': match is not None and iscoroutinefunction(match.func),
+        'status': response.status_code,
+        'duration_ms': round(elapsed * 1000, 2),
+        'user': user.get_username() if user is not None and user.is_authenticated else None,
+        'queries': queries.count,
+        'query_ms': round(queries.seconds * 1000, 2),
+        'queries_logged': len(queries.entries),
+    }
+    name = profile_store.save(profiler, meta, queries.entries)
+    return response, name
@@ -0,0 +1,50 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import phase
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that serializes with orjson when it is installed.
+
+    numpy arrays are written directly; datetimes, and anything else orjson
+    does not know, are handed to DRF's encoder, so they are formatted the
+    same as by JSONRenderer and the async views. Indented output (the browsable API) and a
+    missing orjson fall back to the stdlib renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with phase('render'):
+            if orjson is None or data is None:
+                return super().render(data, accepted_media_type, renderer_context)
+            if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+            return orjson.dumps(
+                data,
+                default=JSONEncoder().default,
+                option=(orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+                        | orjson.OPT_PASSTHROUGH_DATETIME)
+            )
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with phase('render'):
+            return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Dataset
+from . import storage
+from .cache import frame_cache
+from .events import event_bus
+
+
+@receiver(post_delete, sender=Dataset)
+def on_dataset_deleted(sender, instance, **kwargs):
+    # Drop the cached memory maps first so the files can be removed.
+    frame_cache.invalidate(instance.id)
+    storage.delete_columns(instance.id)
+    event_bus.publish('dataset-pruned', {'id': instance.id, 'name': instance.name})
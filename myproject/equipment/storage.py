@@ -0,0 +1,256 @@
+import gc
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+
+NUMERIC_COLUMNS = ('flowrate', 'pressure', 'temperature')
+ROW_FIELDS = ('id', 'equipment_name', 'equipment_type') + NUMERIC_COLUMNS
+COLUMN_DTYPE = np.float64
+# Left in a column directory that could not be removed (e.g. still
+# memory-mapped on Windows) so it is never read again and is retried later.
+DELETED_MARKER = '.deleted'
+REMOVE_ATTEMPTS = 3
+
+logger = logging.getLogger(__name__)
+
+
+def is_enabled():
+    return getattr(settings, 'EQUIPMENT_COLUMNAR_STORAGE', False)
+
+
+def dataset_dir(dataset_id):
+    return Path(settings.MEDIA_ROOT) / 'datasets' / str(dataset_id)
+
+
+class ColumnarDataset:
+    """Read-only column view of one dataset.
+
+    Numeric columns are float64 arrays (memory-mapped when loaded from disk),
+    equipment types are int32 codes into ``type_labels`` and names live in one
+    UTF-8 blob addressed by ``name_offsets``.
+    """
+
+    def __init__(self, ids, name_offsets, names_blob, type_codes, type_labels,
+                 flowrate, pressure, temperature, source=None):
+        self.ids = ids
+        self.name_offsets = name_offsets
+        self.names_blob = names_blob
+        self.type_codes = type_codes
+        self.type_labels = type_labels
+        self.flowrate = flowrate
+        self.pressure = pressure
+        self.temperature = temperature
+        # Directory the columns are mapped from, if any.
+        self.source = source
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held on the heap; memory-mapped columns are not counted.
+
+        Mapped pages belong to the OS page cache and are cheap to read back,
+        so they should not push DB-built datasets out of the frame cache.
+        """
+        arrays = (self.ids, self.name_offsets, self.names_blob, self.type_codes,
+                  self.flowrate, self.pressure, self.temperature)
+        return sum(_resident_nbytes(a) for a in arrays)
+
+    def is_stale(self):
+        """Whether the column files these arrays map have been deleted."""
+        if self.source is None:
+            return False
+        return not (self.source / 'meta.json').exists() or (self.source / DELETED_MARKER).exists()
+
+    def name(self, index):
+        start, end = self.name_offsets[index], self.name_offsets[index + 1]
+        return bytes(self.names_blob[start:end]).decode('utf-8')
+
+    def type_distribution(self):
+        counts = np.bincount(self.type_codes, minlength=len(self.type_labels))
+        return {label: int(count) for label, count in zip(self.type_labels, counts) if count}
+
+    def averages(self):
+        if not len(self):
+            return {column: None for column in NUMERIC_COLUMNS}
+        return {column: float(getattr(self, column).mean()) for column in NUMERIC_COLUMNS}
+
+    def series(self, points):
+        if len(self) > points:
+            index = np.linspace(0, len(self) - 1, points).astype(np.int64)
+        else:
+            index = np.arange(len(self))
+        series = {'index': index.tolist()}
+        for column in NUMERIC_COLUMNS:
+            series[column] = getattr(self, column)[index].tolist()
+        return series
+
+    def column_slice(self, start=0, stop=None, fields=ROW_FIELDS):
+        stop = len(self) if stop is None else min(stop, len(self))
+        start = min(start, stop)
+        data = {}
+        if 'id' in fields:
+            data['id'] = np.asarray(self.ids[start:stop])
+        if 'equipment_name' in fields:
+            data['equipment_name'] = [self.name(index) for index in range(start, stop)]
+        if 'equipment_type' in fields:
+            data['equipment_type'] = [self.type_labels[code] for code in self.type_codes[start:stop]]
+        for column in NUMERIC_COLUMNS:
+            if column in fields:
+                data[column] = np.asarray(getattr(self, column)[start:stop])
+        return data
+
+    def rows(self, start=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        rows = []
+        for index in range(start, stop):
+            rows.append({
+                'id': int(self.ids[index]),
+                'equipment_name': self.name(index),
+                'equipment_type': self.type_labels[self.type_codes[index]],
+                'flowrate': float(self.flowrate[index]),
+                'pressure': float(self.pressure[index]),
+                'temperature': float(self.temperature[index])
+            })
+        return rows
+
+
+def _resident_nbytes(array):
+    view = array
+    while isinstance(view, np.ndarray):
+        if isinstance(view, np.memmap):
+            return 0
+        view = view.base
+    return array.nbytes
+
+
+def build_columns(ids, names, types, flowrate, pressure, temperature):
+    encoded = [str(name).encode('utf-8') for name in names]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        np.cumsum([len(b) for b in encoded], out=name_offsets[1:])
+    type_labels, first_seen, type_codes = np.unique(
+        np.asarray([str(t) for t in types], dtype=str), return_index=True, return_inverse=True
+    )
+    # Number types in order of first appearance, like the row-by-row ORM path.
+    order = np.argsort(first_seen)
+    type_labels = type_labels[order]
+    type_codes = np.argsort(order)[type_codes]
+    return ColumnarDataset(
+        ids=np.asarray(ids, dtype=np.int64),
+        name_offsets=name_offsets,
+        names_blob=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        type_codes=type_codes.astype(np.int32).reshape(-1),
+        type_labels=[str(label) for label in type_labels],
+        flowrate=np.asarray(flowrate, dtype=COLUMN_DTYPE),
+        pressure=np.asarray(pressure, dtype=COLUMN_DTYPE),
+        temperature=np.asarray(temperature, dtype=COLUMN_DTYPE),
+    )
+
+
+def columns_from_rows(rows):
+    if not rows:
+        return build_columns([], [], [], [], [], [])
+    ids, names, types, flowrate, pressure, temperature = zip(*rows)
+    return build_columns(ids, names, types, flowrate, pressure, temperature)
+
+
+def columns_from_db(dataset):
+    return columns_from_rows(list(dataset.equipments.order_by('id').values_list(*ROW_FIELDS)))
+
+
+def save_columns(dataset_id, columns):
+    target = dataset_dir(dataset_id)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    sweep_deleted()
+    staging = Path(tempfile.mkdtemp(prefix=f'.{dataset_id}-', dir=target.parent))
+    try:
+        for name in ('ids', 'name_offsets', 'type_codes') + NUMERIC_COLUMNS:
+            np.save(staging / f'{name}.npy', getattr(columns, name))
+        np.save(staging / 'names.npy', columns.names_blob)
+        with open(staging / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump({'count': len(columns), 'type_labels': columns.type_labels}, f)
+        if target.exists() and not _remove_tree(target):
+            raise OSError(f'Column files in {target} are still in use')
+        os.replace(staging, target)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def load_columns(dataset_id):
+    source = dataset_dir(dataset_id)
+    meta_path = source / 'meta.json'
+    if not meta_path.exists() or (source / DELETED_MARKER).exists():
+        return None
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+
+    def load(name):
+        try:
+            return np.load(source / f'{name}.npy', mmap_mode='r')
+        except ValueError:
+            # Zero-length arrays cannot be memory-mapped.
+            return np.load(source / f'{name}.npy')
+
+    return ColumnarDataset(
+        ids=load('ids'),
+        name_offsets=load('name_offsets'),
+        names_blob=load('names'),
+        type_codes=load('type_codes'),
+        type_labels=meta['type_labels'],
+        flowrate=load('flowrate'),
+        pressure=load('pressure'),
+        temperature=load('temperature'),
+        source=source,
+    )
+
+
+def delete_columns(dataset_id):
+    """Remove a dataset's column files.
+
+    Evict the dataset from the frame cache first: files that are still
+    memory-mapped cannot be deleted on Windows. If removal still fails the
+    directory is marked deleted and retried by later saves and deletes.
+    """
+    target = dataset_dir(dataset_id)
+    if target.exists():
+        try:
+            (target / DELETED_MARKER).touch()
+        except OSError:
+            pass
+        _remove_tree(target)
+    sweep_deleted()
+
+
+def sweep_deleted():
+    root = Path(settings.MEDIA_ROOT) / 'datasets'
+    for marker in root.glob(f'*/{DELETED_MARKER}'):
+        _remove_tree(marker.parent, attempts=1, warn=False)
+
+
+def _remove_tree(path, attempts=REMOVE_ATTEMPTS, warn=True):
+    for attempt in range(attempts):
+        try:
+            shutil.rmtree(path)
+            return True
+        except FileNotFoundError:
+            return True
+        except OSError as e:
+            error = e
+            if attempt + 1 < attempts:
+                # Maps of dropped arrays close once they are collected.
+                gc.collect()
+                time.sleep(0.05 * (attempt + 1))
+    if warn:
+        logger.warning('Could not remove %s (%s); will retry later', path, error)
+    return False
@@ -1 +1,997 @@
-from django.test import TestCase
+import asyncio
+import cProfile
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from importlib.util import find_spec
+from pathlib import Path
+from unittest import mock, skipIf
+
+import numpy as np
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.db import connection
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.utils.cache import patch_vary_headers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import storage
+from .async_views import event_stream
+from .cache import DatasetFrameCache, frame_cache, get_columns
+from .events import EventBus, event_bus, format_sse
+from .metrics import MetricsRegistry
+from .middleware import CompressionMiddleware, brotli
+from .renderers import FastJSONRenderer, msgpack, orjson
+from .models import Dataset, Equipment
+from .views import _history_entry, _summary_payload
+from .profiling import ProfileStore, QueryLog, profile_store, profiles_dir
+
+
+def make_columns(rows):
+    return storage.build_columns(
+        list(range(1, rows + 1)),
+        [f'Unit-{index}' for index in range(rows)],
+        ['Pump' if index % 2 else 'Valve' for index in range(rows)],
+        [float(index) for index in range(rows)],
+        [index / 10 for index in range(rows)],
+        [20.0 + index for index in range(rows)],
+    )
+
+
+def make_csv(rows):
+    lines = ['Equipment Name,Type,Flowrate,Pressure,Temperature']
+    lines += [f'Unit-{index},{"Pump" if index % 2 else "Valve"},{index}.5,{index / 10},{20 + index}'
+              for index in range(rows)]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def make_dataset(rows, name='plant.csv'):
+    dataset = Dataset.objects.create(name=name)
+    Equipment.objects.bulk_create([
+        Equipment(dataset=dataset, equipment_name=f'Unit-{index}',
+                  equipment_type='Pump' if index % 2 else 'Valve',
+                  flowrate=float(index), pressure=index / 10, temperature=20.0 + index)
+        for index in range(rows)
+    ])
+    return dataset
+
+
+class ApiTestCase(TestCase):
+    def setUp(self):
+        self.addCleanup(frame_cache.clear)
+        user = User.objects.create_user('reader', password='reader')
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+
+    def get(self, path, **kwargs):
+        return self.client.get(f'/api/equipment/{path}', headers=self.headers, **kwargs)
+
+
+class DatasetFrameCacheTests(SimpleTestCase):
+    def test_concurrent_async_misses_load_once(self):
+        cache = DatasetFrameCache()
+        calls = 0
+
+        async def loader():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return make_columns(10)
+
+        async def scenario():
+            return await asyncio.gather(*[cache.aget(1, loader) for _ in range(20)])
+
+        results = asyncio.run(scenario())
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(columns is results[0] for columns in results))
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_cancelled_waiter_does_not_cancel_shared_load(self):
+        cache = DatasetFrameCache()
+
+        async def loader():
+            await asyncio.sleep(0.05)
+            return make_columns(5)
+
+        async def scenario():
+            first = asyncio.ensure_future(cache.aget(1, loader))
+            second = asyncio.ensure_future(cache.aget(1, loader))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+
+        self.assertEqual(len(asyncio.run(scenario())), 5)
+        self.assertIsNotNone(cache.peek(1))
+
+    def test_failed_async_load_is_retried(self):
+        cache = DatasetFrameCache()
+        attempts = []
+
+        async def loader():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError('disk went away')
+            return make_columns(3)
+
+        async def scenario():
+            with self.assertRaises(OSError):
+                await cache.aget(1, loader)
+            return await cache.aget(1, loader)
+
+        self.assertEqual(len(asyncio.run(scenario())), 3)
+        self.assertEqual(len(attempts), 2)
+
+    def test_memory_mapped_columns_do_not_use_the_budget(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        from_db = make_columns(100)
+        storage.save_columns(2, make_columns(1000))
+        mapped = storage.load_columns(2)
+        self.assertEqual(mapped.nbytes, 0)
+
+        cache = DatasetFrameCache(max_bytes=from_db.nbytes)
+        cache.put(1, from_db)
+        cache.put(2, mapped)
+        self.assertIs(cache.peek(1), from_db)
+        self.assertEqual(cache.stats()['evictions'], 0)
+
+    def test_evicts_least_recently_used_over_budget(self):
+        first, second, third = make_columns(10), make_columns(10), make_columns(10)
+        cache = DatasetFrameCache(max_bytes=first.nbytes * 2)
+        cache.put(1, first)
+        cache.put(2, second)
+        self.assertIs(cache.peek(1), first)
+        self.assertIsNone(cache.peek(4))
+        cache.put(3, third)
+        self.assertIsNone(cache.peek(2))
+        self.assertIs(cache.peek(1), first)
+        self.assertIs(cache.peek(3), third)
+        self.assertEqual(cache.stats(), {
+            'entries': 2, 'size_bytes': first.nbytes * 2, 'max_bytes': first.nbytes * 2,
+            'max_entries': 32, 'hits': 3, 'misses': 0, 'evictions': 1, 'hit_rate': 1.0,
+        })
+        self.assertEqual(len(cache.get(2, lambda: make_columns(10))), 10)
+        self.assertEqual((cache.stats()['misses'], cache.stats()['hit_rate']), (1, 0.75))
+
+    def test_oversized_columns_are_not_cached(self):
+        cache = DatasetFrameCache(max_bytes=make_columns(10).nbytes)
+        cache.put(1, make_columns(10))
+        cache.put(2, make_columns(100))
+        self.assertIsNone(cache.peek(2))
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_entry_cap_evicts_memory_mapped_columns(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        cache = DatasetFrameCache(max_entries=2)
+        for dataset_id in (1, 2, 3):
+            storage.save_columns(dataset_id, make_columns(10))
+            cache.put(dataset_id, storage.load_columns(dataset_id))
+        self.assertIsNone(cache.peek(1))
+        self.assertEqual((cache.stats()['entries'], cache.stats()['evictions']), (2, 1))
+
+    def test_columns_deleted_elsewhere_are_dropped_on_lookup(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        cache = DatasetFrameCache()
+        for dataset_id in (1, 2):
+            storage.save_columns(dataset_id, make_columns(10))
+            cache.put(dataset_id, storage.load_columns(dataset_id))
+        # As another worker's delete would: a marker, or the files gone.
+        (storage.dataset_dir(1) / storage.DELETED_MARKER).touch()
+        shutil.rmtree(storage.dataset_dir(2))
+        self.assertIsNone(cache.peek(1))
+        loaded = cache.get(2, lambda: make_columns(4))
+        self.assertEqual(len(loaded), 4)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+
+class EventBusTests(SimpleTestCase):
+    def test_publish_reaches_every_subscriber(self):
+        async def scenario():
+            bus = EventBus()
+            subscriptions = [bus.subscribe() for _ in range(3)]
+            event = bus.publish('dataset-created', {'id': 7})
+            return event, [await asyncio.wait_for(s.get(), 1) for s in subscriptions]
+
+        event, received = asyncio.run(scenario())
+        self.assertEqual(received, [event] * 3)
+
+    def test_publish_from_another_thread(self):
+        async def scenario():
+            bus = EventBus()
+            subscription = bus.subscribe()
+            publisher = threading.Thread(target=bus.publish, args=('dataset-pruned', {'id': 1}))
+            publisher.start()
+            publisher.join()
+            return await asyncio.wait_for(subscription.get(), 1)
+
+        self.assertEqual(asyncio.run(scenario())['event'], 'dataset-pruned')
+
+    def test_full_queue_drops_oldest_event(self):
+        async def scenario():
+            bus = EventBus(queue_size=2)
+            subscription = bus.subscribe()
+            for index in range(3):
+                bus.publish('ingest-progress', {'rows_done': index})
+            await asyncio.sleep(0)
+            return [subscription.queue.get_nowait()['data']['rows_done'] for _ in range(2)]
+
+        self.assertEqual(asyncio.run(scenario()), [1, 2])
+
+    def test_close_unsubscribes(self):
+        async def scenario():
+            bus = EventBus()
+            subscription = bus.subscribe()
+            self.assertEqual(bus.subscriber_count, 1)
+            subscription.close()
+            return bus.subscriber_count
+
+        self.assertEqual(asyncio.run(scenario()), 0)
+
+    def test_event_stream_formats_events_and_heartbeats(self):
+        async def scenario():
+            bus = EventBus()
+            subscription = bus.subscribe()
+            stream = event_stream(subscription, heartbeat=0.01)
+            messages = [await stream.__anext__(), await stream.__anext__()]
+            event = bus.publish('dataset-created', {'id': 3})
+            messages.append(await stream.__anext__())
+            await stream.aclose()
+            return event, messages
+
+        event, messages = asyncio.run(scenario())
+        self.assertTrue(messages[0].startswith('retry:'))
+        self.assertEqual(messages[1], ': keep-alive\n\n')
+        self.assertEqual(messages[2], format_sse(event))
+
+    def test_idle_subscribers_use_negligible_cpu(self):
+        count, idle = 300, 1.0
+
+        async def scenario():
+            bus = EventBus()
+            delivered = 0
+
+            async def client():
+                nonlocal delivered
+                subscription = bus.subscribe()
+                stream = event_stream(subscription, heartbeat=60)
+                try:
+                    async for message in stream:
+                        if message.startswith('id:'):
+                            delivered += 1
+                            return
+                finally:
+                    await stream.aclose()
+                    subscription.close()
+
+            clients = [asyncio.create_task(client()) for _ in range(count)]
+            while bus.subscriber_count < count:
+                await asyncio.sleep(0.01)
+            cpu_started = time.process_time()
+            await asyncio.sleep(idle)
+            idle_cpu = time.process_time() - cpu_started
+
+            bus.publish('dataset-created', {'id': 0})
+            await asyncio.wait_for(asyncio.gather(*clients), 10)
+            return idle_cpu, delivered, bus.subscriber_count
+
+        idle_cpu, delivered, remaining = asyncio.run(scenario())
+        self.assertLess(idle_cpu / idle, 0.05)
+        self.assertEqual(delivered, count)
+        self.assertEqual(remaining, 0)
+
+
+class EventsViewTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user('events', password='events')
+        self.headers = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+
+    def test_requires_token(self):
+        self.assertEqual(self.client.get('/api/equipment/events/').status_code, 401)
+
+    def test_wsgi_is_refused(self):
+        response = self.client.get('/api/equipment/events/', headers=self.headers)
+        self.assertEqual(response.status_code, 501)
+
+    async def test_asgi_stream_unsubscribes_on_disconnect(self):
+        before = event_bus.subscriber_count
+        first_chunk = asyncio.Event()
+        disconnect = asyncio.Event()
+        sent = []
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+            if message['type'] == 'http.response.body':
+                first_chunk.set()
+
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': 'GET', 'scheme': 'http', 'path': '/api/equipment/events/',
+            'query_string': b'', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1),
+            'headers': [(b'host', b'testserver'),
+                        (b'authorization', self.headers['Authorization'].encode())],
+        }
+        app = asyncio.create_task(ASGIHandler()(scope, receive, send))
+        await asyncio.wait_for(first_chunk.wait(), 5)
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertTrue(sent[1]['body'].startswith(b'retry:'))
+        self.assertEqual(event_bus.subscriber_count, before + 1)
+
+        disconnect.set()
+        await asyncio.wait_for(app, 5)
+        self.assertEqual(event_bus.subscriber_count, before)
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    def test_exited_threads_are_folded_into_retired_totals(self):
+        registry = MetricsRegistry()
+
+        def record():
+            registry.inc('equipment_http_requests_total', ('get_summary', 'GET', '200'))
+            registry.observe('equipment_db_queries_per_request', ('get_summary',), 2)
+
+        for _ in range(200):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        record()
+
+        counters, histograms = registry.collect()
+        self.assertEqual(counters[('equipment_http_requests_total', ('get_summary', 'GET', '200'))], 201)
+        self.assertEqual(histograms[('equipment_db_queries_per_request', ('get_summary',))][-1], 402)
+        self.assertEqual(registry.shard_count, 1)
+
+    def test_render_is_prometheus_text(self):
+        registry = MetricsRegistry()
+        registry.observe('equipment_http_request_duration_seconds', ('get_history', 'GET'), 0.02)
+        text = registry.render()
+        self.assertIn('# TYPE equipment_http_request_duration_seconds histogram', text)
+        self.assertIn('equipment_http_request_duration_seconds_bucket'
+                      '{view="get_history",method="GET",le="0.025"} 1', text)
+        self.assertIn('equipment_http_request_duration_seconds_count'
+                      '{view="get_history",method="GET"} 1', text)
+
+
+class MetricsViewTests(TestCase):
+    @override_settings(EQUIPMENT_METRICS_TOKEN=None)
+    def test_staff_only_without_scrape_token(self):
+        user = User.objects.create_user('plain', password='plain')
+        staff = User.objects.create_user('staff', password='staff', is_staff=True)
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        headers = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+        self.assertEqual(self.client.get('/metrics', headers=headers).status_code, 401)
+        headers = {'Authorization': f'Token {Token.objects.create(user=staff).key}'}
+        response = self.client.get('/metrics', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'equipment_http_requests_total', response.content)
+
+    @override_settings(EQUIPMENT_METRICS_TOKEN='scrape')
+    def test_scrape_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer scrape'})
+        self.assertEqual(response.status_code, 200)
+
+
+class CacheStatsViewTests(ApiTestCase):
+    def test_staff_only(self):
+        self.assertEqual(self.get('cache/stats/').status_code, 403)
+
+    def test_reports_lookups(self):
+        staff = User.objects.create_user('staff', password='staff', is_staff=True)
+        dataset = make_dataset(4)
+        frame_cache.clear()
+        self.get(f'summary/{dataset.id}/')
+        self.get(f'summary/{dataset.id}/')
+        response = self.client.get('/api/equipment/cache/stats/', headers={
+            'Authorization': f'Token {Token.objects.create(user=staff).key}'
+        })
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()['frame_cache']
+        self.assertEqual((stats['entries'], stats['hits'], stats['misses'], stats['hit_rate']),
+                         (1, 1, 1, 0.5))
+        self.assertEqual(stats['size_bytes'], frame_cache.peek(dataset.id).nbytes)
+
+
+class ColumnFileDeletionTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.addCleanup(frame_cache.clear)
+
+    def test_cache_is_evicted_before_files_are_removed(self):
+        dataset = Dataset.objects.create(name='a.csv')
+        storage.save_columns(dataset.id, make_columns(10))
+        frame_cache.put(dataset.id, storage.load_columns(dataset.id))
+        cached_during_delete = []
+        real_rmtree = shutil.rmtree
+
+        def rmtree(path, *args, **kwargs):
+            cached_during_delete.append(frame_cache.peek(dataset.id) is not None)
+            return real_rmtree(path, *args, **kwargs)
+
+        with mock.patch('equipment.storage.shutil.rmtree', side_effect=rmtree):
+            dataset_id = dataset.id
+            dataset.delete()
+        self.assertEqual(cached_during_delete, [False])
+        self.assertFalse(storage.dataset_dir(dataset_id).exists())
+
+    def test_failed_removal_is_hidden_and_retried(self):
+        storage.save_columns(1, make_columns(5))
+        with mock.patch('equipment.storage.shutil.rmtree', side_effect=PermissionError('in use')), \
+                mock.patch('equipment.storage.time.sleep'), \
+                self.assertLogs('equipment.storage', 'WARNING'):
+            storage.delete_columns(1)
+        self.assertTrue((storage.dataset_dir(1) / storage.DELETED_MARKER).exists())
+        self.assertIsNone(storage.load_columns(1))
+
+        storage.delete_columns(2)
+        self.assertFalse(storage.dataset_dir(1).exists())
+
+    def test_save_replaces_directory_left_by_failed_delete(self):
+        storage.save_columns(1, make_columns(5))
+        (storage.dataset_dir(1) / storage.DELETED_MARKER).touch()
+        storage.save_columns(1, make_columns(7))
+        self.assertEqual(len(storage.load_columns(1)), 7)
+
+
+class AsyncReadViewTests(ApiTestCase):
+    def test_data_honours_fields_and_shape_like_the_sync_view(self):
+        dataset = make_dataset(30)
+        query = {'shape': 'columns', 'fields': 'flowrate,pressure', 'offset': 5, 'limit': 10}
+        expected = self.get(f'data/{dataset.id}/', data=query).json()
+        response = self.get(f'async/data/{dataset.id}/', data=query)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(set(expected['data']), {'flowrate', 'pressure'})
+
+    def test_data_rejects_unknown_fields(self):
+        dataset = make_dataset(3)
+        response = self.get(f'async/data/{dataset.id}/', data={'fields': 'colour'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BundleViewTests(ApiTestCase):
+    def test_bundle_has_summary_history_page_and_series(self):
+        older = make_dataset(2, name='older.csv')
+        dataset = make_dataset(30)
+        response = self.get(f'bundle/{dataset.id}/', data={'limit': 10, 'points': 5})
+        self.assertEqual(response.status_code, 200)
+        bundle = response.json()
+        self.assertEqual(bundle['dataset_id'], dataset.id)
+        self.assertEqual(bundle['summary']['total_count'], 30)
+        self.assertEqual(bundle['summary']['type_distribution'], {'Valve': 15, 'Pump': 15})
+        self.assertEqual(bundle['summary']['averages']['flowrate'], 14.5)
+        self.assertEqual([entry['id'] for entry in bundle['history']], [dataset.id, older.id])
+        self.assertEqual(bundle['total'], 30)
+        self.assertEqual(bundle['offset'], 0)
+        self.assertEqual(len(bundle['data']), 10)
+        self.assertEqual(bundle['data'][0]['equipment_name'], 'Unit-0')
+        self.assertEqual(bundle['series']['index'], [0, 7, 14, 21, 29])
+
+    def test_missing_dataset_is_404(self):
+        self.assertEqual(self.get('bundle/999/').status_code, 404)
+
+    def test_empty_dataset_keeps_summary_and_history(self):
+        dataset = make_dataset(0)
+        response = self.get(f'bundle/{dataset.id}/')
+        self.assertEqual(response.status_code, 200)
+        bundle = response.json()
+        self.assertEqual(bundle['summary']['total_count'], 0)
+        self.assertEqual(bundle['summary']['type_distribution'], {})
+        self.assertEqual([entry['id'] for entry in bundle['history']], [dataset.id])
+        self.assertEqual((bundle['data'], bundle['total']), ([], 0))
+        self.assertEqual(bundle['series']['flowrate'], [])
+
+    def test_invalid_parameters_are_400(self):
+        dataset = make_dataset(3)
+        for query in ({'fields': 'flowrate,colour'}, {'offset': -1}, {'limit': 0},
+                      {'limit': 'ten'}, {'points': 0}):
+            with self.subTest(query=query):
+                self.assertEqual(self.get(f'bundle/{dataset.id}/', data=query).status_code, 400)
+
+
+class EquipmentDataViewTests(ApiTestCase):
+    def test_rows_and_columns_shapes_hold_the_same_values(self):
+        dataset = make_dataset(12)
+        rows = self.get(f'data/{dataset.id}/', data={'offset': 4, 'limit': 5}).json()
+        columns = self.get(f'data/{dataset.id}/',
+                           data={'offset': 4, 'limit': 5, 'shape': 'columns'}).json()
+        self.assertEqual((rows['offset'], rows['total']), (4, 12))
+        self.assertEqual(len(rows['data']), 5)
+        self.assertEqual(list(columns['data']), list(storage.ROW_FIELDS))
+        for field in storage.ROW_FIELDS:
+            self.assertEqual(columns['data'][field], [row[field] for row in rows['data']])
+
+    def test_fields_limit_a_columns_page(self):
+        dataset = make_dataset(4)
+        response = self.get(f'data/{dataset.id}/',
+                            data={'shape': 'columns', 'fields': 'flowrate, pressure'})
+        self.assertEqual(response.json()['data'], {
+            'flowrate': [0.0, 1.0, 2.0, 3.0], 'pressure': [0.0, 0.1, 0.2, 0.3]
+        })
+
+    def test_page_past_the_end_is_empty(self):
+        dataset = make_dataset(4)
+        response = self.get(f'data/{dataset.id}/', data={'offset': 10, 'limit': 5})
+        self.assertEqual(response.json(), {'data': [], 'offset': 10, 'total': 4})
+
+    def test_invalid_parameters_are_400(self):
+        dataset = make_dataset(3)
+        for query in ({'fields': 'colour'}, {'offset': 'x'}, {'offset': -5},
+                      {'limit': 100001}):
+            with self.subTest(query=query):
+                self.assertEqual(self.get(f'data/{dataset.id}/', data=query).status_code, 400)
+
+    def test_missing_dataset_is_404(self):
+        self.assertEqual(self.get('data/999/').status_code, 404)
+
+    def test_empty_dataset(self):
+        dataset = make_dataset(0)
+        response = self.get(f'data/{dataset.id}/', data={'shape': 'columns'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 0)
+        self.assertEqual(response.json()['data']['flowrate'], [])
+
+
+class ConditionalAndFormatTests(ApiTestCase):
+    def test_matching_if_none_match_is_304(self):
+        dataset = make_dataset(5)
+        response = self.get(f'summary/{dataset.id}/')
+        etag = response['ETag']
+        response = self.get(f'summary/{dataset.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+    def test_etag_differs_per_query_and_accept(self):
+        dataset = make_dataset(5)
+        etags = {
+            self.get(f'data/{dataset.id}/')['ETag'],
+            self.get(f'data/{dataset.id}/', data={'shape': 'columns'})['ETag'],
+            self.get(f'data/{dataset.id}/', HTTP_ACCEPT='application/msgpack')['ETag'],
+        }
+        self.assertEqual(len(etags), 3)
+
+    @skipIf(msgpack is None, 'msgpack is not installed')
+    def test_msgpack_matches_json(self):
+        dataset = make_dataset(20)
+        query = {'shape': 'columns', 'limit': 10}
+        expected = self.get(f'data/{dataset.id}/', data=query).json()
+        response = self.get(f'data/{dataset.id}/', data=query, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+
+
+    @skipIf(orjson is None, 'orjson is not installed')
+    def test_orjson_output_matches_drf(self):
+        dataset = make_dataset(20)
+        columns = get_columns(dataset)
+        dataset.equipment_count = len(columns)
+        payload = {
+            **_summary_payload(dataset, columns),
+            'history': [_history_entry(dataset)],
+            'data': columns.rows(0, 5),
+            'series': columns.series(5),
+        }
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_datetimes_match_across_endpoints(self):
+        dataset = make_dataset(5)
+        expected = JSONEncoder().default(dataset.uploaded_at)
+        self.assertEqual(self.get(f'summary/{dataset.id}/').json()['uploaded_at'], expected)
+        self.assertEqual(self.get(f'async/summary/{dataset.id}/').json()['uploaded_at'], expected)
+        self.assertEqual(self.get('history/').json()['history'][0]['uploaded_at'], expected)
+
+@override_settings(EQUIPMENT_COMPRESS_MIN_BYTES=1024)
+class CompressionTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dataset = make_dataset(200)
+        self.path = f'data/{self.dataset.id}/'
+        self.plain = self.get(self.path)
+
+    def test_gzip(self):
+        response = self.get(self.path, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.plain.content)
+        self.assertEqual(response['ETag'], 'W/' + self.plain['ETag'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli_is_preferred(self):
+        response = self.get(self.path, HTTP_ACCEPT_ENCODING='gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), self.plain.content)
+        self.assertEqual(response['ETag'], 'W/' + self.plain['ETag'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+    def test_weak_etag_still_revalidates(self):
+        etag = self.get(self.path, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.get(self.path, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.get('history/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertLess(len(response.content), 1024)
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    body = b'{"flowrate": [1.0, 2.0, 3.0]}' * 200
+
+    def process(self, response, accept_encoding='gzip, br'):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_event_streams_are_not_compressed(self):
+        stream = StreamingHttpResponse(iter([b'data: {}\n\n'] * 500), content_type='text/event-stream')
+        self.assertFalse(self.process(stream).has_header('Content-Encoding'))
+
+    def test_already_compressed_types_are_skipped(self):
+        response = self.process(HttpResponse(self.body, content_type='application/pdf'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.body)
+
+    def test_cookie_dependent_responses_get_padded_gzip(self):
+        response = HttpResponse(self.body, content_type='text/html')
+        patch_vary_headers(response, ('Cookie',))
+        response = self.process(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+
+class UploadTests(ApiTestCase):
+    def upload(self, content, name='plant.csv', content_type='text/csv', query=''):
+        return self.client.post(
+            f'/api/equipment/upload/{query}', headers=self.headers,
+            data={'file': SimpleUploadedFile(name, content, content_type=content_type)}
+        )
+
+    def test_upload_echoes_rows_and_caches_columns(self):
+        response = self.upload(make_csv(3))
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body['equipment_count'], 3)
+        self.assertEqual(body['dataset_name'], 'plant.csv')
+        ids = list(Equipment.objects.filter(dataset_id=body['dataset_id'])
+                   .order_by('id').values_list('id', flat=True))
+        self.assertEqual(body['equipment'][1], {
+            'id': ids[1], 'equipment_name': 'Unit-1', 'equipment_type': 'Pump',
+            'flowrate': 1.5, 'pressure': 0.1, 'temperature': 21.0
+        })
+        columns = frame_cache.peek(body['dataset_id'])
+        self.assertEqual(columns.ids.tolist(), ids)
+        self.assertEqual(columns.type_distribution(), {'Valve': 2, 'Pump': 1})
+
+    def test_rows_0_skips_the_echo(self):
+        response = self.upload(make_csv(3), query='?rows=0')
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('equipment', response.json())
+        self.assertEqual(response.json()['equipment_count'], 3)
+
+    def test_missing_columns_are_400(self):
+        response = self.upload(b'Equipment Name,Type\nA,Pump\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Flowrate', response.json()['error'])
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_gzip_upload_by_name(self):
+        response = self.upload(gzip.compress(make_csv(4)), name='plant.csv.gz',
+                               content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['dataset_name'], 'plant.csv')
+        self.assertEqual(response.json()['equipment_count'], 4)
+
+    def test_gzip_upload_by_content_type(self):
+        response = self.upload(gzip.compress(make_csv(4)), name='plant.csv',
+                               content_type='application/gzip')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['equipment_count'], 4)
+
+    def test_gzip_bomb_is_400(self):
+        content = make_csv(0) + b'Unit,Pump,1,1,1\n' * 100000
+        with override_settings(EQUIPMENT_UPLOAD_MAX_DECOMPRESSED_BYTES=64 * 1024):
+            response = self.upload(gzip.compress(content), name='bomb.csv.gz')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('larger than 65536 bytes', response.json()['error'])
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_ids_are_read_back_when_bulk_insert_returns_none(self):
+        features = type(connection.features)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', False), \
+                mock.patch('equipment.views.INGEST_BATCH_SIZE', 2):
+            response = self.upload(make_csv(5))
+        self.assertEqual(response.status_code, 201)
+        dataset_id = response.json()['dataset_id']
+        ids = list(Equipment.objects.filter(dataset_id=dataset_id)
+                   .order_by('id').values_list('id', flat=True))
+        self.assertEqual([row['id'] for row in response.json()['equipment']], ids)
+        self.assertEqual(frame_cache.peek(dataset_id).ids.tolist(), ids)
+
+    def test_failed_ingest_leaves_no_rows(self):
+        with mock.patch('equipment.views.storage.build_columns', side_effect=RuntimeError('boom')), \
+                mock.patch('equipment.views.INGEST_BATCH_SIZE', 2), \
+                mock.patch('equipment.views.event_bus') as bus:
+            response = self.upload(make_csv(5))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Dataset.objects.exists())
+        self.assertFalse(Equipment.objects.exists())
+        name, data = bus.publish.call_args_list[-1].args
+        self.assertEqual(name, 'ingest-failed')
+        self.assertEqual((data['dataset_name'], data['rows_done'], data['rows_total']),
+                         ('plant.csv', 5, 5))
+
+    def test_batched_ingest_publishes_progress(self):
+        with mock.patch('equipment.views.INGEST_BATCH_SIZE', 2), \
+                mock.patch('equipment.views.event_bus') as bus:
+            response = self.upload(make_csv(5), query='?rows=0')
+        self.assertEqual(response.status_code, 201)
+        dataset_id = response.json()['dataset_id']
+        self.assertEqual(Equipment.objects.filter(dataset_id=dataset_id).count(), 5)
+        events = [(call.args[0], call.args[1]) for call in bus.publish.call_args_list]
+        progress = [data for name, data in events if name == 'ingest-progress']
+        self.assertEqual([data['rows_done'] for data in progress], [2, 4, 5])
+        self.assertTrue(all(data['rows_total'] == 5 and data['dataset_id'] == dataset_id
+                            for data in progress))
+        self.assertEqual(events[-1][0], 'dataset-created')
+        self.assertEqual(events[-1][1]['equipment_count'], 5)
+
+
+class ColumnarStorageTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(EQUIPMENT_COLUMNAR_STORAGE=True, MEDIA_ROOT=media_root))
+
+    def test_upload_read_and_delete(self):
+        response = self.client.post('/api/equipment/upload/?rows=0', headers=self.headers, data={
+            'file': SimpleUploadedFile('plant.csv', make_csv(6), content_type='text/csv')
+        })
+        self.assertEqual(response.status_code, 201)
+        dataset = Dataset.objects.get(id=response.json()['dataset_id'])
+        directory = storage.dataset_dir(dataset.id)
+        self.assertTrue((directory / 'meta.json').exists())
+        self.assertIsInstance(frame_cache.peek(dataset.id).flowrate, np.memmap)
+
+        # Reads after a cold start come from the column files, not the ORM.
+        frame_cache.clear()
+        with mock.patch('equipment.cache.storage.columns_from_db', side_effect=AssertionError):
+            summary = self.get(f'summary/{dataset.id}/').json()['summary']
+            columns = frame_cache.peek(dataset.id)
+            data = self.get(f'data/{dataset.id}/', data={'offset': 4}).json()
+            pdf = self.get(f'pdf/{dataset.id}/')
+        self.assertIsInstance(columns.flowrate, np.memmap)
+        self.assertEqual(summary['total_count'], 6)
+        self.assertEqual(summary['type_distribution'], {'Valve': 3, 'Pump': 3})
+        self.assertEqual(summary['averages']['flowrate'], 3.0)
+        ids = list(dataset.equipments.order_by('id').values_list('id', flat=True))
+        self.assertEqual([(row['id'], row['equipment_name']) for row in data['data']],
+                         [(ids[4], 'Unit-4'), (ids[5], 'Unit-5')])
+        self.assertEqual(data['total'], 6)
+        self.assertEqual(pdf.status_code, 200)
+        self.assertEqual(pdf['Content-Type'], 'application/pdf')
+
+        dataset.delete()
+        self.assertFalse(directory.exists())
+        self.assertIsNone(frame_cache.peek(dataset.id))
+        self.assertEqual(self.get(f'summary/{dataset.id}/').status_code, 404)
+
+
+class CommittedIngestTests(TransactionTestCase):
+    def test_progress_is_published_after_each_batch_commits(self):
+        user = User.objects.create_user('reader', password='reader')
+        headers = {'Authorization': f'Token {Token.objects.create(user=user).key}'}
+        self.addCleanup(frame_cache.clear)
+        in_transaction = []
+        with mock.patch('equipment.views.INGEST_BATCH_SIZE', 2), \
+                mock.patch('equipment.views.event_bus') as bus:
+            bus.publish.side_effect = lambda *args: in_transaction.append(connection.in_atomic_block)
+            response = self.client.post('/api/equipment/upload/?rows=0', headers=headers, data={
+                'file': SimpleUploadedFile('plant.csv', make_csv(5), content_type='text/csv')
+            })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(in_transaction, [False] * 4)
+
+
+class ProfileStoreTests(SimpleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+
+    def save(self, store, created):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        profiler.disable()
+        return store.save(profiler, {'created': created, 'path': '/x'}, [])
+
+    def test_keeps_newest(self):
+        store = ProfileStore(keep=3)
+        names = [self.save(store, 1700000000 + index) for index in range(5)]
+        self.assertEqual([meta['name'] for meta in store.list()], names[:1:-1])
+        self.assertEqual(sorted(path.name for path in profiles_dir().iterdir()),
+                         sorted(f'{name}{suffix}' for name in names[2:] for suffix in ('.json', '.prof')))
+
+    @override_settings(EQUIPMENT_PROFILE_KEEP=1)
+    def test_keep_setting(self):
+        store = ProfileStore()
+        self.save(store, 1700000000)
+        name = self.save(store, 1700000001)
+        self.assertEqual([meta['name'] for meta in store.list()], [name])
+
+    def test_path_rejects_bad_names(self):
+        store = ProfileStore()
+        name = self.save(store, 1700000000)
+        self.assertTrue(store.path(name, '.prof').exists())
+        self.assertIn('function calls', store.stats_text(name))
+        for bad_name, suffix in [('../../settings', '.json'), (name + '/..', '.json'),
+                                 (name, '.json.tmp'), (name, '.py'),
+                                 ('20230101-000000-000000-abcdef', '.json')]:
+            with self.subTest(name=bad_name, suffix=suffix), self.assertRaises(FileNotFoundError):
+                store.path(bad_name, suffix)
+
+
+class QueryLogTests(TestCase):
+    def test_redacts_secrets(self):
+        log = QueryLog(secrets=('s3cret', '', None))
+        with connection.execute_wrapper(log):
+            list(User.objects.filter(username='s3cret'))
+            list(User.objects.filter(username='alice'))
+        self.assertEqual(log.count, 2)
+        self.assertEqual(log.entries[0]['params'][0], '<redacted>')
+        self.assertIn('alice', log.entries[1]['params'])
+
+    def test_limit(self):
+        log = QueryLog(limit=1)
+        with connection.execute_wrapper(log):
+            User.objects.count()
+            User.objects.count()
+        self.assertEqual((log.count, len(log.entries)), (2, 1))
+
+
+@override_settings(EQUIPMENT_PROFILING=True)
+class ProfilingMiddlewareTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.dataset = make_dataset(3)
+        staff = User.objects.create_user('staff', password='staff', is_staff=True)
+        self.staff_token = Token.objects.create(user=staff).key
+        self.staff_headers = {'Authorization': f'Token {self.staff_token}'}
+
+    def test_non_staff_not_profiled(self):
+        response = self.get(f'summary/{self.dataset.id}/', HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response.headers)
+        self.assertEqual(profile_store.list(), [])
+
+    def test_unrequested_not_profiled(self):
+        response = self.client.get(f'/api/equipment/summary/{self.dataset.id}/', headers=self.staff_headers)
+        self.assertNotIn('X-Profile-Id', response.headers)
+
+    def test_staff_profile_is_stored_with_token_redacted(self):
+        response = self.client.get(f'/api/equipment/summary/{self.dataset.id}/?profile=1',
+                                   headers=self.staff_headers)
+        self.assertEqual(response.status_code, 200)
+        name = response.headers['X-Profile-Id']
+        [meta] = profile_store.list()
+        self.assertEqual((meta['name'], meta['view'], meta['status'], meta['user'], meta['async_view']),
+                         (name, 'get_summary', 200, 'staff', False))
+        self.assertGreater(meta['queries'], 0)
+        with open(profile_store.path(name, '.json')) as f:
+            log = f.read()
+        self.assertNotIn(self.staff_token, log)
+        self.assertIn('<redacted>', log)
+
+    def test_async_view_is_flagged(self):
+        response = self.client.get(f'/api/equipment/async/summary/{self.dataset.id}/',
+                                   headers={**self.staff_headers, 'X-Profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        [meta] = profile_store.list()
+        self.assertEqual((meta['name'], meta['view'], meta['async_view']),
+                         (response.headers['X-Profile-Id'], 'async_get_summary', True))
+
+
+@override_settings(EQUIPMENT_PROFILING=True)
+class ProfileAdminTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        User.objects.create_user('staff', password='staff', is_staff=True)
+        profiler = cProfile.Profile()
+        profiler.enable()
+        profiler.disable()
+        self.name = profile_store.save(profiler, {
+            'created': time.time(), 'method': 'GET', 'path': '/api/equipment/async/history/',
+            'view': 'async_get_history', 'async_view': True, 'status': 200, 'duration_ms': 1.0,
+            'user': 'staff', 'queries': 1, 'query_ms': 0.1, 'queries_logged': 1,
+        }, [{'sql': 'SELECT 1', 'params': [], 'many': False, 'ms': 0.1}])
+
+    def test_requires_staff(self):
+        response = self.client.get('/admin/profiles/')
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/admin/login/', response['Location'])
+        User.objects.create_user('plain', password='plain')
+        self.client.login(username='plain', password='plain')
+        self.assertEqual(self.client.get(f'/admin/profiles/{self.name}.prof').status_code, 302)
+
+    def test_list_and_downloads(self):
+        self.client.login(username='staff', password='staff')
+        response = self.client.get('/admin/profiles/')
+        self.assertContains(response, self.name)
+        self.assertContains(response, 'async_get_history (async)')
+        response = self.client.get(f'/admin/profiles/{self.name}.stats')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        self.assertIn(b'function calls', response.content)
+        response = self.client.get(f'/admin/profiles/{self.name}.json')
+        self.assertIn(b'SELECT 1', b''.join(response.streaming_content))
+        response = self.client.get(f'/admin/profiles/{self.name}.prof')
+        self.assertIn('attachment', response['Content-Disposition'])
+        response.close()
+
+    def test_unknown_kind_or_name_is_404(self):
+        self.client.login(username='staff', password='staff')
+        for path in [f'{self.name}.py', f'{self.name}.json.tmp', '20230101-000000-000000-abcdef.json',
+                     'settings.json']:
+            with self.subTest(path=path):
+                self.assertEqual(self.client.get(f'/admin/profiles/{path}').status_code, 404)
+
+
+@skipIf(find_spec('PyQt5') is None, 'PyQt5 is not installed')
+class DesktopStartupTests(SimpleTestCase):
+    """Run desktop_app/bench_startup.py against startup_baseline.json."""
+
+    app_dir = Path(settings.BASE_DIR) / 'desktop_app'
+
+    def bench(self, *args):
+        return subprocess.run(
+            [sys.executable, 'bench_startup.py', '--runs', '3', *args],
+            cwd=self.app_dir, capture_output=True, text=True, timeout=300,
+            env={**os.environ, 'QT_QPA_PLATFORM': 'offscreen'},
+        )
+
+    def test_startup_within_baseline(self):
+        result = self.bench()
+        self.assertEqual(result.returncode, 0, result.stdout + result.stderr)
+
+    def test_slower_than_baseline_fails(self):
+        with open(self.app_dir / 'startup_baseline.json') as f:
+            baseline = json.load(f)
+        baseline.update(import_ms=0.1, startup_ms=0.1)
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+            json.dump(baseline, f)
+        self.addCleanup(os.remove, f.name)
+        result = self.bench('--baseline', f.name)
+        self.assertEqual(result.returncode, 1)
+        self.assertIn('FAIL: startup_ms', result.stdout)
@@ -4,9 +4,13 @@ from .views import (
     get_summary,
     get_history,
     get_equipment_data,
-    generate_pdf
+    get_series,
+    get_bundle,
+    generate_pdf,
+    get_cache_stats
 )
 from .auth_views import login, register
+from . import async_views
 
 urlpatterns = [
     path("auth/login/", login, name="login"),
@@ -15,5 +19,13 @@ urlpatterns = [
     path("summary/<int:dataset_id>/", get_summary, name="get_summary"),
     path("history/", get_history, name="get_history"),
     path("data/<int:dataset_id>/", get_equipment_data, name="get_equipment_data"),
+    path("series/<int:dataset_id>/", get_series, name="get_series"),
+    path("bundle/<int:dataset_id>/", get_bundle, name="get_bundle"),
     path("pdf/<int:dataset_id>/", generate_pdf, name="generate_pdf"),
+    path("cache/stats/", get_cache_stats, name="get_cache_stats"),
+    path("async/history/", async_views.get_history, name="async_get_history"),
+    path("async/summary/<int:dataset_id>/", async_views.get_summary, name="async_get_summary"),
+    path("async/data/<int:dataset_id>/", async_views.get_equipment_data, name="async_get_equipment_data"),
+    path("async/series/<int:dataset_id>/", async_views.get_series, name="async_get_series"),
+    path("events/", async_views.get_events, name="get_events"),
 ]
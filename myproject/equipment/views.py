@@ -1,19 +1,256 @@
+import numpy as np
 import pandas as pd
+from django.conf import settings
 from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Avg
+from django.db import connection, transaction
 from .models import Dataset, Equipment
+from . import storage
+from .cache import frame_cache, get_columns
+from .events import event_bus
+from .metrics import phase, registry
+from .profiling import is_staff
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
+import gzip
+import hashlib
 import io
 
 
+INGEST_BATCH_SIZE = 5000
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 100000
+DEFAULT_SERIES_POINTS = 500
+MAX_SERIES_POINTS = 10000
+GZIP_CONTENT_TYPES = ('application/gzip', 'application/x-gzip')
+DEFAULT_MAX_DECOMPRESSED_BYTES = 512 * 1024 * 1024
+
+
+def _dataset_statistics(dataset):
+    columns = get_columns(dataset)
+    if not len(columns):
+        return None
+    return len(columns), columns.averages(), columns.type_distribution()
+
+
+def _summary_payload(dataset, columns):
+    averages = columns.averages()
+    return {
+        'dataset_id': dataset.id,
+        'dataset_name': dataset.name,
+        'uploaded_at': dataset.uploaded_at,
+        'summary': {
+            'total_count': len(columns),
+            'averages': {
+                name: round(value, 2) if value else 0 for name, value in averages.items()
+            },
+            'type_distribution': columns.type_distribution()
+        }
+    }
+
+
+def _history_queryset():
+    return Dataset.objects.order_by('-uploaded_at')[:5]
+
+
+def _history_datasets():
+    # Counted per dataset after the slice: each count reads only that
+    # dataset's rows through the dataset_id index, where a Count annotation
+    # groups every Equipment row before the limit applies.
+    datasets = list(_history_queryset())
+    for dataset in datasets:
+        dataset.equipment_count = dataset.equipments.count()
+    return datasets
+
+
+def _history_entry(dataset):
+    return {
+        'id': dataset.id,
+        'name': dataset.name,
+        'uploaded_at': dataset.uploaded_at,
+        'equipment_count': dataset.equipment_count
+    }
+
+
+class _CappedReader:
+    """File wrapper that fails once more than ``limit`` bytes were read."""
+
+    def __init__(self, fileobj, limit):
+        self.fileobj = fileobj
+        self.limit = limit
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise ValueError(f'Decompressed upload is larger than {self.limit} bytes')
+        return data
+
+
+def _open_upload(upload):
+    # The desktop client gzips large CSVs and sends them as <name>.csv.gz;
+    # they are decompressed while pandas reads them, up to a cap so a small
+    # gzip bomb cannot exhaust memory.
+    if upload.name.endswith('.gz') or upload.content_type in GZIP_CONTENT_TYPES:
+        limit = getattr(settings, 'EQUIPMENT_UPLOAD_MAX_DECOMPRESSED_BYTES',
+                        DEFAULT_MAX_DECOMPRESSED_BYTES)
+        source = _CappedReader(gzip.GzipFile(fileobj=upload, mode='rb'), limit)
+        return upload.name.removesuffix('.gz'), source
+    return upload.name, upload
+
+
+def _page_bounds(request, default_limit):
+    try:
+        offset = int(request.GET.get('offset', 0))
+        limit = request.GET.get('limit', default_limit)
+        limit = None if limit is None else int(limit)
+    except ValueError:
+        raise ValueError('offset and limit must be integers')
+    if offset < 0 or (limit is not None and not 1 <= limit <= MAX_PAGE_SIZE):
+        raise ValueError(f'offset must be >= 0 and limit between 1 and {MAX_PAGE_SIZE}')
+    return offset, limit
+
+
+def _page_fields(request):
+    # ?fields=flowrate,pressure trims a columns-shaped page to what the
+    # caller plots, skipping the costly name and type columns.
+    fields = request.GET.get('fields')
+    if not fields:
+        return storage.ROW_FIELDS
+    fields = tuple(field.strip() for field in fields.split(','))
+    unknown = [field for field in fields if field not in storage.ROW_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}')
+    return fields
+
+
+def _page_data(request, columns, start, stop, fields=storage.ROW_FIELDS):
+    # ?shape=columns sends each field name once with an array of values
+    # instead of repeating every key on every row.
+    if request.GET.get('shape') == 'columns':
+        return columns.column_slice(start, stop, fields)
+    return columns.rows(start, stop)
+
+
+def _dataset_etag(request, dataset, *extra):
+    # Datasets never change after upload, so the id and upload time identify
+    # their content; the query string and Accept header pick the rendering.
+    variant = '|'.join([request.GET.urlencode(), request.META.get('HTTP_ACCEPT', '')] + list(extra))
+    digest = hashlib.md5(variant.encode('utf-8'), usedforsecurity=False).hexdigest()[:12]
+    return f'"{dataset.id}-{int(dataset.uploaded_at.timestamp() * 1000000)}-{digest}"'
+
+
+def _not_modified(request, etag):
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return _with_etag(response, etag)
+    return None
+
+
+def _with_etag(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _equipment_rows(dataset, limit=None):
+    return get_columns(dataset).rows(0, limit)
+
+
+def _series_points(request):
+    try:
+        points = int(request.GET.get('points', DEFAULT_SERIES_POINTS))
+    except ValueError:
+        points = 0
+    if not 1 <= points <= MAX_SERIES_POINTS:
+        raise ValueError(f'points must be between 1 and {MAX_SERIES_POINTS}')
+    return points
+
+
+def _ingest(dataset_name, df):
+    """Insert the parsed rows in batches, committing each batch.
+
+    Returns the new dataset and its columns, built from ``df`` and the ids
+    of the created rows. Committing per batch keeps SQLite's write lock
+    short, so other requests can still read during a large upload; on
+    failure the partial dataset is deleted and ``ingest-failed`` published.
+    """
+    total_rows = len(df)
+    ids = np.empty(total_rows, dtype=np.int64)
+    # bulk_create only fills in primary keys on some backends (SQLite 3.35+,
+    # PostgreSQL); elsewhere they are read back once the rows are in.
+    returns_ids = connection.features.can_return_rows_from_bulk_insert
+    dataset = Dataset.objects.create(name=dataset_name)
+    rows_done = 0
+    try:
+        with phase('insert'):
+            for start in range(0, total_rows, INGEST_BATCH_SIZE):
+                batch = df.iloc[start:start + INGEST_BATCH_SIZE]
+                with transaction.atomic():
+                    created = Equipment.objects.bulk_create([
+                        Equipment(
+                            dataset=dataset,
+                            equipment_name=name,
+                            equipment_type=equipment_type,
+                            flowrate=float(flowrate),
+                            pressure=float(pressure),
+                            temperature=float(temperature)
+                        )
+                        for name, equipment_type, flowrate, pressure, temperature in zip(
+                            batch['Equipment Name'], batch['Type'], batch['Flowrate'],
+                            batch['Pressure'], batch['Temperature']
+                        )
+                    ])
+                if returns_ids:
+                    ids[start:start + len(created)] = [equipment.id for equipment in created]
+                rows_done = start + len(created)
+                # Only announced once committed, so subscribers can read them.
+                event_bus.publish('ingest-progress', {
+                    'dataset_id': dataset.id,
+                    'dataset_name': dataset.name,
+                    'rows_done': rows_done,
+                    'rows_total': total_rows
+                })
+            if not returns_ids:
+                # Auto-increment ids follow insertion order.
+                ids[:] = np.fromiter(
+                    dataset.equipments.order_by('id').values_list('id', flat=True).iterator(),
+                    dtype=np.int64, count=total_rows
+                )
+
+        # Columns come straight from the parsed frame, so memory doesn't
+        # grow by a dict per row on top of it.
+        with phase('aggregate'):
+            columns = storage.build_columns(
+                ids, df['Equipment Name'], df['Type'],
+                df['Flowrate'], df['Pressure'], df['Temperature'],
+            )
+            if storage.is_enabled():
+                frame_cache.invalidate(dataset.id)
+                storage.save_columns(dataset.id, columns)
+                columns = storage.load_columns(dataset.id)
+    except BaseException:
+        dataset_id = dataset.id
+        dataset.delete()
+        event_bus.publish('ingest-failed', {
+            'dataset_id': dataset_id,
+            'dataset_name': dataset_name,
+            'rows_done': rows_done,
+            'rows_total': total_rows
+        })
+        raise
+    return dataset, columns
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def upload_csv(request):
@@ -21,9 +258,11 @@ def upload_csv(request):
         return Response({'error': 'No file provided'}, status=status.HTTP_400_BAD_REQUEST)
     
     csv_file = request.FILES['file']
+    dataset_name, source = _open_upload(csv_file)
     
     try:
-        df = pd.read_csv(csv_file)
+        with phase('parse'):
+            df = pd.read_csv(source)
         
         required_columns = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
         missing_columns = [col for col in required_columns if col not in df.columns]
@@ -32,41 +271,33 @@ def upload_csv(request):
                 'error': f'Missing required columns: {", ".join(missing_columns)}'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        dataset_name = csv_file.name
-        dataset = Dataset.objects.create(name=dataset_name)
-        
-        equipment_list = []
-        for _, row in df.iterrows():
-            equipment = Equipment.objects.create(
-                dataset=dataset,
-                equipment_name=row['Equipment Name'],
-                equipment_type=row['Type'],
-                flowrate=float(row['Flowrate']),
-                pressure=float(row['Pressure']),
-                temperature=float(row['Temperature'])
-            )
-            equipment_list.append({
-                'id': equipment.id,
-                'equipment_name': equipment.equipment_name,
-                'equipment_type': equipment.equipment_type,
-                'flowrate': equipment.flowrate,
-                'pressure': equipment.pressure,
-                'temperature': equipment.temperature
-            })
-        
+        dataset, columns = _ingest(dataset_name, df)
+        total_rows = len(columns)
+        frame_cache.put(dataset.id, columns)
+        event_bus.publish('dataset-created', {
+            'id': dataset.id,
+            'name': dataset.name,
+            'uploaded_at': dataset.uploaded_at,
+            'equipment_count': total_rows
+        })
+
         datasets = Dataset.objects.all().order_by('-uploaded_at')
         if datasets.count() > 5:
             for ds in datasets[5:]:
                 ds.delete()
         
-        return Response({
+        payload = {
             'message': 'CSV uploaded successfully',
             'dataset_id': dataset.id,
             'dataset_name': dataset.name,
             'uploaded_at': dataset.uploaded_at,
-            'equipment_count': len(equipment_list),
-            'equipment': equipment_list
-        }, status=status.HTTP_201_CREATED)
+            'equipment_count': total_rows
+        }
+        # ?rows=0 skips echoing every inserted row, which dominates the
+        # response for large uploads.
+        if request.GET.get('rows') != '0':
+            payload['equipment'] = columns.rows()
+        return Response(payload, status=status.HTTP_201_CREATED)
         
     except Exception as e:
         return Response({
@@ -79,35 +310,19 @@ def upload_csv(request):
 def get_summary(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id)
-        equipment_list = Equipment.objects.filter(dataset=dataset)
-        
-        if not equipment_list.exists():
-            return Response({'error': 'No equipment data found'}, status=status.HTTP_404_NOT_FOUND)
+        etag = _dataset_etag(request, dataset)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
         
-        total_count = equipment_list.count()
-        avg_flowrate = equipment_list.aggregate(Avg('flowrate'))['flowrate__avg']
-        avg_pressure = equipment_list.aggregate(Avg('pressure'))['pressure__avg']
-        avg_temperature = equipment_list.aggregate(Avg('temperature'))['temperature__avg']
+        with phase('aggregate'):
+            columns = get_columns(dataset)
+            payload = _summary_payload(dataset, columns) if len(columns) else None
         
-        type_distribution = {}
-        for equipment in equipment_list:
-            eq_type = equipment.equipment_type
-            type_distribution[eq_type] = type_distribution.get(eq_type, 0) + 1
+        if payload is None:
+            return Response({'error': 'No equipment data found'}, status=status.HTTP_404_NOT_FOUND)
         
-        return Response({
-            'dataset_id': dataset.id,
-            'dataset_name': dataset.name,
-            'uploaded_at': dataset.uploaded_at,
-            'summary': {
-                'total_count': total_count,
-                'averages': {
-                    'flowrate': round(avg_flowrate, 2) if avg_flowrate else 0,
-                    'pressure': round(avg_pressure, 2) if avg_pressure else 0,
-                    'temperature': round(avg_temperature, 2) if avg_temperature else 0
-                },
-                'type_distribution': type_distribution
-            }
-        }, status=status.HTTP_200_OK)
+        return _with_etag(Response(payload, status=status.HTTP_200_OK), etag)
         
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -118,18 +333,7 @@ def get_summary(request, dataset_id):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_history(request):
-    datasets = Dataset.objects.all().order_by('-uploaded_at')[:5]
-    
-    history = []
-    for dataset in datasets:
-        equipment_count = Equipment.objects.filter(dataset=dataset).count()
-        history.append({
-            'id': dataset.id,
-            'name': dataset.name,
-            'uploaded_at': dataset.uploaded_at,
-            'equipment_count': equipment_count
-        })
-    
+    history = [_history_entry(dataset) for dataset in _history_datasets()]
     return Response({'history': history}, status=status.HTTP_200_OK)
 
 
@@ -138,23 +342,89 @@ def get_history(request):
 def get_equipment_data(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id)
-        equipment_list = Equipment.objects.filter(dataset=dataset)
+        offset, limit = _page_bounds(request, default_limit=None)
+        fields = _page_fields(request)
+        etag = _dataset_etag(request, dataset)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
         
-        data = []
-        for equipment in equipment_list:
-            data.append({
-                'id': equipment.id,
-                'equipment_name': equipment.equipment_name,
-                'equipment_type': equipment.equipment_type,
-                'flowrate': equipment.flowrate,
-                'pressure': equipment.pressure,
-                'temperature': equipment.temperature
-            })
+        with phase('load'):
+            columns = get_columns(dataset)
+        stop = None if limit is None else offset + limit
+        
+        return _with_etag(Response({
+            'data': _page_data(request, columns, offset, stop, fields),
+            'offset': offset,
+            'total': len(columns)
+        }, status=status.HTTP_200_OK), etag)
+        
+    except Dataset.DoesNotExist:
+        return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_bundle(request, dataset_id):
+    try:
+        offset, limit = _page_bounds(request, default_limit=DEFAULT_PAGE_SIZE)
+        fields = _page_fields(request)
+        points = _series_points(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    datasets = _history_datasets()
+    dataset = next((ds for ds in datasets if ds.id == dataset_id), None)
+    if dataset is None:
+        try:
+            dataset = Dataset.objects.get(id=dataset_id)
+        except Dataset.DoesNotExist:
+            return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    # The history part changes whenever datasets are added or pruned.
+    etag = _dataset_etag(request, dataset, *[f'{ds.id}:{ds.equipment_count}' for ds in datasets])
+    not_modified = _not_modified(request, etag)
+    if not_modified is not None:
+        return not_modified
+    
+    # An empty dataset still gets its summary and history, with no rows.
+    with phase('load'):
+        columns = get_columns(dataset)
+    
+    with phase('aggregate'):
+        bundle = _summary_payload(dataset, columns)
+    bundle.update({
+        'history': [_history_entry(ds) for ds in datasets],
+        'data': _page_data(request, columns, offset, offset + limit, fields),
+        'offset': offset,
+        'total': len(columns),
+        'series': columns.series(points)
+    })
+    return _with_etag(Response(bundle, status=status.HTTP_200_OK), etag)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_series(request, dataset_id):
+    try:
+        dataset = Dataset.objects.get(id=dataset_id)
+        points = _series_points(request)
+        etag = _dataset_etag(request, dataset)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
         
-        return Response({'data': data}, status=status.HTTP_200_OK)
+        return _with_etag(Response({
+            'dataset_id': dataset.id,
+            'series': get_columns(dataset).series(points)
+        }, status=status.HTTP_200_OK), etag)
         
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(['GET'])
@@ -162,20 +432,21 @@ def get_equipment_data(request, dataset_id):
 def generate_pdf(request, dataset_id):
     try:
         dataset = Dataset.objects.get(id=dataset_id)
-        equipment_list = Equipment.objects.filter(dataset=dataset)
+        etag = _dataset_etag(request, dataset)
+        not_modified = _not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
         
-        if not equipment_list.exists():
-            return Response({'error': 'No equipment data found'}, status=status.HTTP_404_NOT_FOUND)
+        with phase('aggregate'):
+            statistics = _dataset_statistics(dataset)
         
-        total_count = equipment_list.count()
-        avg_flowrate = equipment_list.aggregate(Avg('flowrate'))['flowrate__avg']
-        avg_pressure = equipment_list.aggregate(Avg('pressure'))['pressure__avg']
-        avg_temperature = equipment_list.aggregate(Avg('temperature'))['temperature__avg']
+        if statistics is None:
+            return Response({'error': 'No equipment data found'}, status=status.HTTP_404_NOT_FOUND)
         
-        type_distribution = {}
-        for equipment in equipment_list:
-            eq_type = equipment.equipment_type
-            type_distribution[eq_type] = type_distribution.get(eq_type, 0) + 1
+        total_count, averages, type_distribution = statistics
+        avg_flowrate = averages['flowrate']
+        avg_pressure = averages['pressure']
+        avg_temperature = averages['temperature']
         
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=letter)
@@ -229,13 +500,13 @@ def generate_pdf(request, dataset_id):
         
         story.append(Paragraph("Equipment Details", styles['Heading2']))
         equipment_data = [['Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']]
-        for equipment in equipment_list[:50]:
+        for equipment in _equipment_rows(dataset, limit=50):
             equipment_data.append([
-                equipment.equipment_name,
-                equipment.equipment_type,
-                f"{equipment.flowrate:.2f}",
-                f"{equipment.pressure:.2f}",
-                f"{equipment.temperature:.2f}"
+                equipment['equipment_name'],
+                equipment['equipment_type'],
+                f"{equipment['flowrate']:.2f}",
+                f"{equipment['pressure']:.2f}",
+                f"{equipment['temperature']:.2f}"
             ])
         
         equipment_table = Table(equipment_data)
@@ -252,14 +523,33 @@ def generate_pdf(request, dataset_id):
         ]))
         story.append(equipment_table)
         
-        doc.build(story)
+        with phase('render'):
+            doc.build(story)
         buffer.seek(0)
         
         response = HttpResponse(buffer.read(), content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="equipment_report_{dataset_id}.pdf"'
-        return response
+        return _with_etag(response, etag)
         
     except Dataset.DoesNotExist:
         return Response({'error': 'Dataset not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_cache_stats(request):
+    return Response({'frame_cache': frame_cache.stats()}, status=status.HTTP_200_OK)
+
+
+def prometheus_metrics(request):
+    # A scrape token if one is configured, otherwise staff only.
+    token = getattr(settings, 'EQUIPMENT_METRICS_TOKEN', None)
+    if token:
+        allowed = request.headers.get('Authorization') == f'Bearer {token}'
+    else:
+        allowed = is_staff(request)
+    if not allowed:
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import './Dashboard.css';
 import CSVUpload from './CSVUpload';
@@ -7,13 +7,17 @@ import Charts from './Charts';
 import History from './History';
 
 const API_BASE_URL = 'http://localhost:8000/api/equipment';
+const PAGE_SIZE = 1000;
 
 function Dashboard({ token, username, onLogout }) {
   const [currentDataset, setCurrentDataset] = useState(null);
   const [equipmentData, setEquipmentData] = useState([]);
+  const [totalCount, setTotalCount] = useState(0);
   const [summary, setSummary] = useState(null);
   const [history, setHistory] = useState([]);
   const [loading, setLoading] = useState(false);
+  const [loadingRows, setLoadingRows] = useState(false);
+  const activeDatasetId = useRef(null);
 
   const axiosConfig = {
     headers: {
@@ -35,19 +39,18 @@ function Dashboard({ token, username, onLogout }) {
   };
 
   const loadDataset = async (datasetId) => {
+    activeDatasetId.current = datasetId;
     setLoading(true);
     try {
-      const summaryResponse = await axios.get(
-        `${API_BASE_URL}/summary/${datasetId}/`,
-        { headers: { 'Authorization': `Token ${token}` } }
-      );
-      setSummary(summaryResponse.data);
-      const dataResponse = await axios.get(
-        `${API_BASE_URL}/data/${datasetId}/`,
+      const response = await axios.get(
+        `${API_BASE_URL}/bundle/${datasetId}/`,
         { headers: { 'Authorization': `Token ${token}` } }
       );
-      setEquipmentData(dataResponse.data.data);
-      setCurrentDataset(summaryResponse.data);
+      setHistory(response.data.history);
+      setSummary(response.data);
+      setEquipmentData(response.data.data);
+      setTotalCount(response.data.total);
+      setCurrentDataset(response.data);
     } catch (error) {
       console.error('Error loading dataset:', error);
       alert('Error loading dataset');
@@ -56,9 +59,33 @@ function Dashboard({ token, username, onLogout }) {
     }
   };
 
+  const loadMoreRows = async () => {
+    const datasetId = activeDatasetId.current;
+    setLoadingRows(true);
+    try {
+      const response = await axios.get(
+        `${API_BASE_URL}/data/${datasetId}/`,
+        {
+          headers: { 'Authorization': `Token ${token}` },
+          params: { offset: equipmentData.length, limit: PAGE_SIZE }
+        }
+      );
+      // Drop a page that arrives after another dataset was opened.
+      if (activeDatasetId.current !== datasetId) {
+        return;
+      }
+      setEquipmentData((rows) => rows.concat(response.data.data));
+      setTotalCount(response.data.total);
+    } catch (error) {
+      console.error('Error loading rows:', error);
+      alert('Error loading more rows');
+    } finally {
+      setLoadingRows(false);
+    }
+  };
+
   const handleUploadSuccess = (dataset) => {
     setCurrentDataset(dataset);
-    fetchHistory();
     loadDataset(dataset.dataset_id);
   };
 
@@ -148,7 +175,12 @@ function Dashboard({ token, username, onLogout }) {
 
             <Charts summary={summary} equipmentData={equipmentData} />
 
-            <DataTable equipmentData={equipmentData} />
+            <DataTable
+              equipmentData={equipmentData}
+              totalCount={totalCount}
+              onLoadMore={loadMoreRows}
+              loadingMore={loadingRows}
+            />
           </>
         )}
       </div>
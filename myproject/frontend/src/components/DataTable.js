@@ -1,13 +1,16 @@
 import React from 'react';
 
-function DataTable({ equipmentData }) {
+function DataTable({ equipmentData, totalCount, onLoadMore, loadingMore }) {
   if (!equipmentData || equipmentData.length === 0) {
     return null;
   }
 
   return (
     <div className="card">
-      <h2>Equipment Data Table</h2>
+      <h2>
+        Equipment Data Table
+        {totalCount > equipmentData.length && ` (${equipmentData.length} of ${totalCount})`}
+      </h2>
       <div style={{ overflowX: 'auto' }}>
         <table className="table">
           <thead>
@@ -32,6 +35,11 @@ function DataTable({ equipmentData }) {
           </tbody>
         </table>
       </div>
+      {totalCount > equipmentData.length && (
+        <button onClick={onLoadMore} className="button" disabled={loadingMore}>
+          {loadingMore ? 'Loading...' : 'Load more rows'}
+        </button>
+      )}
     </div>
   );
 }
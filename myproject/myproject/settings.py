@@ -1,3 +1,5 @@
+import os
+from importlib.util import find_spec
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -22,7 +24,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'equipment.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'equipment.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -30,6 +34,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'equipment.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'myproject.urls'
@@ -87,6 +92,16 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Also persist each uploaded dataset as packed, memory-mapped column files
+# under MEDIA_ROOT/datasets/ and serve reads from them instead of the ORM.
+EQUIPMENT_COLUMNAR_STORAGE = False
+
+# Memory budget for the per-process LRU of loaded dataset columns shared by
+# the summary, data and PDF endpoints. Memory-mapped column files don't count.
+EQUIPMENT_FRAME_CACHE_BYTES = 256 * 1024 * 1024
+# Most datasets the LRU keeps at once, which bounds open memory maps too.
+EQUIPMENT_FRAME_CACHE_ENTRIES = 32
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
@@ -95,6 +110,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'equipment.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
         'rest_framework.parsers.MultiPartParser',
@@ -102,6 +121,25 @@ REST_FRAMEWORK = {
     ],
 }
 
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('equipment.renderers.MessagePackRenderer')
+
+# Gzipped CSV uploads are rejected with a 400 once they decompress past this.
+EQUIPMENT_UPLOAD_MAX_DECOMPRESSED_BYTES = 512 * 1024 * 1024
+
+# Responses smaller than this are sent uncompressed.
+EQUIPMENT_COMPRESS_MIN_BYTES = 1024
+
+# When set, /metrics requires "Authorization: Bearer <token>"; when unset it
+# is served to staff users only (session or API token).
+EQUIPMENT_METRICS_TOKEN = os.environ.get('EQUIPMENT_METRICS_TOKEN')
+
+# Let staff profile single requests with "X-Profile: 1" or "?profile=1".
+# Profiles are kept under MEDIA_ROOT/profiles/, newest EQUIPMENT_PROFILE_KEEP
+# only, and listed at /admin/profiles/. Off means the middleware is not loaded.
+EQUIPMENT_PROFILING = False
+EQUIPMENT_PROFILE_KEEP = 50
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
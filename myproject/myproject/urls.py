@@ -1,7 +1,12 @@
 from django.contrib import admin
 from django.urls import path, include
 
+from equipment.admin import profile_urls
+from equipment.views import prometheus_metrics
+
 urlpatterns = [
+    path('admin/profiles/', include(profile_urls)),
     path('admin/', admin.site.urls),
     path('api/equipment/', include('equipment.urls')),
+    path('metrics', prometheus_metrics, name='metrics'),
 ]